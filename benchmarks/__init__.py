@@ -0,0 +1,2 @@
+# ベンチマーク・負荷試験用のスクリプト
+# リポジトリのルートから python -m benchmarks.<スクリプト名> で実行する
@@ -0,0 +1,186 @@
+# QuizData のメモリ使用量・処理速度の比較
+# (v1.0: 旧 QuizData（dict ベース、表示のたびに計算）と現在の QuizData（__slots__ + 事前計算）を比較する)
+#
+# 使い方: python -m benchmarks.bench_quiz_data [問題数]
+
+import sys
+import time
+import tracemalloc
+
+from utils.quiz_view import QuizData, OPTION_LABELS
+
+
+# 🔽 --- 比較用: v3.2 までの QuizData（そのままコピー） --- 🔽
+class LegacyQuizData:
+    """
+    スプレッドシートの1行（1問）のデータを格納するクラス
+    bot.py がこのクラスのリストを作成して QuizView に渡します
+    (v3.2: 画像のみの選択肢に対応)
+    """
+    def __init__(self, record: dict):
+        # record は {'text': '問題文', 'option_1': '選択肢1', ...} のような辞書
+        self.question_id = record.get('question_id', 'N/A')
+        self.question_text = record.get('text')  # スプレッドシートのカラム名は 'text'
+        
+        # 🔽 修正: 選択肢とその画像を同時に収集
+        self.options = []
+        self.option_images = []
+        
+        for i in range(1, 10):  # option_9 まで自動で探す
+            opt_text = record.get(f'option_{i}')
+            opt_image = record.get(f'option_{i}_image')
+            
+            # テキストまたは画像のいずれかが存在する場合に選択肢として追加
+            has_text = opt_text is not None and str(opt_text).strip() != ""
+            has_image = opt_image is not None and str(opt_image).strip() != ""
+            
+            if has_text or has_image:
+                # テキストが空の場合はデフォルトのラベルを設定
+                if has_text:
+                    self.options.append(str(opt_text))
+                else:
+                    # 画像のみの場合、ラベルマップに対応した文字を使用
+                    label_map = {1: "A", 2: "B", 3: "C", 4: "D", 5: "E", 6: "F", 7: "G", 8: "H", 9: "I"}
+                    self.options.append(f"選択肢{label_map.get(i, str(i))}")
+                
+                # 画像URLを追加（なければNone）
+                if has_image:
+                    self.option_images.append(str(opt_image).strip())
+                else:
+                    self.option_images.append(None)
+            else:
+                # テキストも画像もない場合は終了
+                break
+        
+        # 🔽 新規追加: 音声URL
+        self.audio_url = record.get('audio_url')
+        if self.audio_url and str(self.audio_url).strip() != "":
+            self.audio_url = str(self.audio_url).strip()
+        else:
+            self.audio_url = None
+        
+        self.correct_answer = str(record.get('correct_answer'))
+        self.explanation = record.get('explanation')
+        
+        # バリデーション（データが揃っているか確認）
+        if not all([self.question_text, self.options, self.correct_answer, self.explanation]):
+            raise ValueError(f"クイズデータに不足があります (ID: {self.question_id}): {record}")
+        
+        # 正解番号（correct_answer）が選択肢の範囲内かチェック
+        try:
+            correct_index = int(self.correct_answer) - 1  # 1始まりを0始まりに
+            if not (0 <= correct_index < len(self.options)):
+                raise ValueError(f"正解番号 '{self.correct_answer}' が選択肢の範囲外です (ID: {self.question_id})")
+        except ValueError:
+            raise ValueError(f"正解番号 '{self.correct_answer}' が数字ではありません (ID: {self.question_id})")
+    
+    @staticmethod
+    def _convert_gdrive_url(url: str) -> str:
+        """
+        GoogleドライブのURLを埋め込み可能な形式に変換
+        例: https://drive.google.com/file/d/FILE_ID/view
+        → https://drive.google.com/uc?export=view&id=FILE_ID
+        """
+        if not url or 'drive.google.com' not in url:
+            return url
+        
+        # file/d/FILE_ID/view 形式の場合
+        if '/file/d/' in url:
+            try:
+                file_id = url.split('/file/d/')[1].split('/')[0]
+                # ?usp=sharing などのパラメータを削除
+                file_id = file_id.split('?')[0]
+                return f"https://drive.google.com/uc?export=view&id={file_id}"
+            except:
+                return url
+        
+        return url
+
+
+# 🔽 --- 1回の表示で必要になる値の計算（旧: create_image_embeds / update_buttons / button_callback 相当） --- 🔽
+def legacy_render_values(question):
+    has_images = any(img for img in question.option_images)
+    labels = []
+    image_urls = []
+    for i, option_text in enumerate(question.options):
+        if has_images:
+            label_map = {0: "A", 1: "B", 2: "C", 3: "D", 4: "E", 5: "F", 6: "G", 7: "H", 8: "I"}
+            labels.append(label_map.get(i, str(i+1)))
+        else:
+            labels.append(option_text)
+    if has_images:
+        for img_url in question.option_images:
+            if img_url:
+                image_urls.append(LegacyQuizData._convert_gdrive_url(img_url))
+    correct_index = int(question.correct_answer) - 1
+    return labels, image_urls, correct_index
+
+
+def compact_render_values(question):
+    return question.button_labels, question.option_images, question.correct_index
+
+
+def make_records(count: int, with_media: bool = True) -> list:
+    """テスト用の問題データ（with_media=True なら半分は画像付き、3分の1は音声付き）"""
+    records = []
+    for n in range(count):
+        record = {
+            'question_id': n,
+            'text': f'第{n}問: この曲の作曲者は誰でしょう？',
+            'correct_answer': (n % 4) + 1,
+            'explanation': f'解説 {n}: ' + 'とても詳しい説明。' * 5,
+        }
+        for i in range(1, 5):
+            record[f'option_{i}'] = f'作曲家{OPTION_LABELS[i - 1]}{n}'
+            if with_media and n % 2 == 0:
+                record[f'option_{i}_image'] = f'https://drive.google.com/file/d/IMG{n}_{i}/view?usp=sharing'
+        if with_media and n % 3 == 0:
+            record['audio_url'] = f'https://drive.google.com/file/d/AUDIO{n}/view?usp=sharing'
+        records.append(record)
+    return records
+
+
+def measure(cls, records, render):
+    # メモリ（records 自体はどちらも共有するため含めない）
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    deck = [cls(record) for record in records]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del deck
+
+    t0 = time.perf_counter()
+    deck = [cls(record) for record in records]
+    build_seconds = time.perf_counter() - t0
+
+    # 1問あたり2回表示される（問題表示 + 答え合わせ）想定で計算
+    t0 = time.perf_counter()
+    for question in deck:
+        render(question)
+        render(question)
+    render_seconds = time.perf_counter() - t0
+    return {
+        'bytes': after - before,
+        'build_ms': build_seconds * 1000,
+        'render_ms': render_seconds * 1000,
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    for title, with_media in (('テキストのみ', False), ('画像・音声あり', True)):
+        records = make_records(count, with_media)
+        legacy = measure(LegacyQuizData, records, legacy_render_values)
+        compact = measure(QuizData, records, compact_render_values)
+
+        print(f"--- {title} (問題数: {count}) ---")
+        print(f"{'':10} {'メモリ(MB)':>12} {'作成(ms)':>10} {'表示用の計算(ms)':>18}")
+        for name, result in (('旧', legacy), ('現在', compact)):
+            print(f"{name:10} {result['bytes'] / 1024 / 1024:>12.2f} {result['build_ms']:>10.1f} {result['render_ms']:>18.1f}")
+        print(f"メモリ: {compact['bytes'] / legacy['bytes']:.2f} 倍, "
+              f"表示用の計算: {legacy['render_ms'] / compact['render_ms']:.1f} 倍速\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# 1問あたりの表示（Embed の作成）にかかる時間の比較
+# (v1.0: 旧方式（表示のたびに Embed を作り直す）と、共有のテンプレートを使う現在の方式を比較する)
+#
+# 使い方: python -m benchmarks.bench_render [問題数]
+
+import asyncio
+import sys
+import time
+
+import discord
+
+from utils.diagnosis_view import DiagnosisView, build_diagnosis_deck
+from utils.quiz_view import OPTION_LABELS, QuizView, build_quiz_deck, get_image_embeds, get_reveal_embeds
+
+REPEAT = 5
+
+
+# 🔽 --- 比較用: v3.7 までの Embed の作成（そのままコピー） --- 🔽
+def legacy_create_embed(view, question):
+    embed = discord.Embed(
+        title=f"【{view.bot_title}】 - 第{view.current_question_index + 1}問",
+        description=f"**{question.question_text}**",
+        color=discord.Color.blue()
+    )
+    embed.set_footer(text=f"全{len(view.questions)}問 | 正解数: {view.correct_count}")
+    return embed
+
+
+def legacy_create_image_embeds(question):
+    image_embeds = []
+    if question.has_images:
+        for i, (option_text, img_url) in enumerate(zip(question.options, question.option_images)):
+            if img_url:
+                embed = discord.Embed(color=discord.Color.blue())
+                embed.set_author(name=f"選択肢 {OPTION_LABELS[i]}: {option_text}")
+                embed.set_image(url=img_url)
+                image_embeds.append(embed)
+    return image_embeds
+
+
+def legacy_render_question(view, question):
+    """旧方式: 問題の表示と答え合わせで、それぞれ Embed を作り直す"""
+    # show_question_with_followup
+    shown = [legacy_create_embed(view, question)] + legacy_create_image_embeds(question)
+    # button_callback
+    result_embed = discord.Embed(title="⭕ 正解！", description=f"**解説:**\n{question.explanation}", color=discord.Color.green())
+    if question.has_images:
+        result_embed.add_field(name="正解", value=f"選択肢 {OPTION_LABELS[question.correct_index]}")
+    else:
+        result_embed.add_field(name="正解", value=f"{question.options[question.correct_index]}")
+    revealed = [legacy_create_embed(view, question)] + legacy_create_image_embeds(question) + [result_embed]
+    return shown, revealed
+
+
+def legacy_render_diagnosis(view, question, result):
+    embed = discord.Embed(
+        title=f"【{view.bot_title}】 - 質問 {view.current_question_index + 1}/{len(view.questions)}",
+        description=f"**{question.question_text}**",
+        color=discord.Color.blue()
+    )
+    if question.axis_name:
+        embed.set_footer(text=f"判定項目: {question.axis_name}")
+    result_embed = discord.Embed(
+        title=f"【{view.bot_title}】 - 診断結果",
+        description=f"✨ **{result.type_name}** ✨\n\n{result.description}",
+        color=discord.Color.gold()
+    )
+    for name, value in (("💪 あなたの強み", result.strength), ("⚠️ 改善ポイント", result.weakness), ("📝 アドバイス", result.advice)):
+        if value:
+            result_embed.add_field(name=name, value=value, inline=False)
+    return embed, result_embed
+# 🔼 --- 比較用 --- 🔼
+
+
+def current_render_question(view, question):
+    """現在の方式: メインEmbed を1回作り、画像・答え合わせはテンプレートを使う"""
+    main_embed = view.create_embed(question)
+    shown = [main_embed, *view.create_image_embeds(question)]
+    view._set_footer(main_embed)
+    revealed = [main_embed, *get_image_embeds(question), get_reveal_embeds(question)[True]]
+    return shown, revealed
+
+
+def current_render_diagnosis(view, question, result_index):
+    return view.create_embed(question), view.templates.result_embeds[result_index]
+
+
+def make_quiz_records(count: int, with_images: bool):
+    records = []
+    for i in range(count):
+        record = {
+            'question_id': i, 'text': f'問題文 {i} ' * 4, 'correct_answer': i % 4 + 1, 'explanation': f'解説 {i} ' * 8,
+        }
+        for n in range(1, 5):
+            record[f'option_{n}'] = f'選択肢 {n}'
+            if with_images:
+                record[f'option_{n}_image'] = f'https://drive.google.com/file/d/IMG{i}_{n}/view?usp=sharing'
+        records.append(record)
+    return records
+
+
+def _measure(render, items, serialize):
+    """1問あたりの時間（μs）を、REPEAT 回の最小値で返す"""
+    best = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        for item in items:
+            embeds = render(*item)
+            if serialize:
+                for group in embeds:
+                    for embed in (group if isinstance(group, (list, tuple)) else (group,)):
+                        embed.to_dict()
+        elapsed = (time.perf_counter() - t0) / len(items) * 1_000_000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def main(count: int):
+    for with_images in (False, True):
+        deck = build_quiz_deck(make_quiz_records(count, with_images))
+        view = QuizView(deck, 'ベンチマーク')
+        items = [(view, q) for q in view.questions]
+        label = '画像あり' if with_images else 'テキストのみ'
+        print(f"\n--- クイズ（{label}, {count}問, 表示 + 答え合わせ） ---")
+        for serialize in (False, True):
+            legacy = _measure(legacy_render_question, items, serialize)
+            current = _measure(current_render_question, items, serialize)
+            suffix = ' + to_dict' if serialize else ''
+            print(f"  Embed の作成{suffix:<10} 旧 {legacy:7.1f}μs/問  新 {current:7.1f}μs/問  ({legacy / current:.1f}倍)")
+        view.stop()
+
+    questions = [
+        {'question_id': i, 'question_text': f'質問 {i}', 'option_1': 'はい', 'option_2': 'いいえ', 'axis_id': i % 2,
+         'code_1': 'U' if i % 2 else 'L', 'code_2': 'u' if i % 2 else 'l', 'axis_name': '軸'}
+        for i in range(16)
+    ]
+    results = [
+        {'type_id': i, 'type_code': code, 'type_name': f'タイプ {code}', 'conditions': cond,
+         'description': '説明 ' * 20, 'strength': '強み ' * 10, 'weakness': '弱み ' * 10, 'advice': 'アドバイス ' * 10}
+        for i, (code, cond) in enumerate([('UL', 'U>=u,L>=l'), ('Ul', 'U>=u,l>L'), ('uL', 'u>U,L>=l'), ('ul', 'u>U,l>L')])
+    ]
+    deck = build_diagnosis_deck(questions, results)
+    view = DiagnosisView(deck, 'ベンチマーク')
+    legacy_items = [(view, q, deck.results[i % 4]) for i, q in enumerate(deck.questions)]
+    current_items = [(view, q, i % 4) for i, q in enumerate(deck.questions)]
+    print(f"\n--- 診断（{len(deck.questions)}問, 質問 + 結果） ---")
+    for serialize in (False, True):
+        legacy = _measure(legacy_render_diagnosis, legacy_items, serialize)
+        current = _measure(current_render_diagnosis, current_items, serialize)
+        suffix = ' + to_dict' if serialize else ''
+        print(f"  Embed の作成{suffix:<10} 旧 {legacy:7.1f}μs/問  新 {current:7.1f}μs/問  ({legacy / current:.1f}倍)")
+    view.stop()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,111 @@
+# Sheets の読み込みの並列性能の比較（ローカルの偽 Sheets サーバーを使用）
+# (v1.0: gspread を別スレッドで呼ぶ方式と、aiohttp で直接呼ぶ非同期クライアントを比較する)
+#
+# 使い方: python -m benchmarks.bench_sheets_async [同時リクエスト数...] [--latency 秒] [--threads スレッド数]
+# 例:     python -m benchmarks.bench_sheets_async 10 50 200 --latency 0.1
+
+import os
+
+# ベンチマークでは Google・ローカルファイルに触れない（utils の import より前に設定する）
+os.environ.setdefault('SHEETS_SNAPSHOT', '0')
+os.environ.setdefault('SHEETS_CHANGE_CHECK', '0')
+# 偽サーバーは1ホストのため、ホストごとの同時接続数をスレッド方式と同程度にする
+os.environ.setdefault('HTTP_LIMIT_PER_HOST', '32')
+
+import asyncio
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import gspread
+import requests
+
+from benchmarks.common import LoopLagMonitor
+from benchmarks.fake_sheets_server import FakeSheetsServer, make_quiz_values
+from utils import http_client, sheets_async, sheets_loader
+
+
+async def _run_case(label, load_one, concurrency):
+    """load_one(i) を同時に concurrency 件実行し、所要時間などを表示する"""
+    latencies = []
+    peak_threads = threading.active_count()
+
+    async def _timed(i):
+        nonlocal peak_threads
+        t0 = time.perf_counter()
+        records = await load_one(i)
+        latencies.append(time.perf_counter() - t0)
+        peak_threads = max(peak_threads, threading.active_count())
+        assert records, f"シート quiz_{i} を読み込めませんでした"
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*[_timed(i) for i in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"  {label:<18} 合計 {elapsed * 1000:7.0f}ms  p50 {statistics.median(latencies) * 1000:6.0f}ms  "
+          f"p95 {p95 * 1000:6.0f}ms  スレッド数 {peak_threads:3d}  ループの最大遅延 {monitor.max_lag * 1000:5.1f}ms")
+
+
+async def main(concurrencies, latency, threads):
+    sheet_count = max(concurrencies)
+    sheets = {f'quiz_{i}': make_quiz_values(50) for i in range(sheet_count)}
+    server = FakeSheetsServer(sheets, latency=latency)
+    base_url = await server.start()
+    await http_client.open_session()
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads))
+
+    # gspread: 実際の bot と同じ HTTPClient.values_batch_get を、偽サーバーに向けて別スレッドで呼ぶ
+    gspread.http_client.SPREADSHEET_VALUES_BATCH_URL = base_url + '/spreadsheets/%s/values:batchGet'
+    gspread_http = gspread.http_client.HTTPClient(auth=None, session=requests.Session())
+
+    def _gspread_fetch(sheet_name):
+        response = gspread_http.values_batch_get(server.spreadsheet_id, [sheets_loader._sheet_range(sheet_name)])
+        return sheets_loader._values_to_records(response['valueRanges'][0].get('values', []))
+
+    async def load_gspread(i):
+        return await asyncio.to_thread(_gspread_fetch, f'quiz_{i}')
+
+    # 非同期: sheets_loader.aload_sheets_data（キャッシュを空にして毎回APIから取得させる）
+    sheets_loader.SHEETS_BACKEND = 'async'
+    sheets_loader.set_async_client(sheets_async.AsyncSheetsClient(
+        server.spreadsheet_id, sheets_async.StaticTokenProvider(), base_url=base_url
+    ))
+
+    async def load_async(i):
+        name = f'quiz_{i}'
+        return (await sheets_loader.aload_sheets_data([name]))[name]
+
+    print(f"[Bench] 偽 Sheets サーバー: {base_url} (応答の遅延 {latency * 1000:.0f}ms, スレッドプール {threads})")
+    for concurrency in concurrencies:
+        print(f"\n--- 同時 {concurrency} 件（すべて別のシート・キャッシュなし） ---")
+        await _run_case('gspread (スレッド)', load_gspread, concurrency)
+        sheets_loader.g_cache.clear()
+        await _run_case('非同期 (aiohttp)', load_async, concurrency)
+
+    print(f"\n[Bench] 偽サーバーへのリクエスト数: {server.requests}, 最大同時処理数: {server.max_concurrent}")
+    print(f"[Bench] sheets_loader の統計: {sheets_loader.get_stats()}")
+    await http_client.close_session()
+    await server.stop()
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    latency = 0.1
+    threads = min(32, (os.cpu_count() or 1) + 4)  # asyncio の既定のスレッドプールと同じ数
+    concurrencies = []
+    while args:
+        arg = args.pop(0)
+        if arg == '--latency':
+            latency = float(args.pop(0))
+        elif arg == '--threads':
+            threads = int(args.pop(0))
+        else:
+            concurrencies.append(int(arg))
+    asyncio.run(main(concurrencies or [10, 50, 200], latency, threads))
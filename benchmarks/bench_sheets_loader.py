@@ -0,0 +1,347 @@
+# sheets_loader の性能の回帰テスト（偽の gspread スプレッドシートを使用、ネットワークなし）
+# (v1.0: load_sheets_data・_fetch_sheet_data・キャッシュの変更を、デプロイ前に基準値と比べて確認する)
+#
+# 測るもの:
+#   cold  キャッシュが空の状態で、全シートを同時に読み込む時間
+#   warm  キャッシュに載っている状態で、1シートを読み込む時間
+#   zipf  コマンドの人気が Zipf 分布に従うリクエストを流したときの、キャッシュのヒット率・API呼び出し数・
+#         取得失敗時に None を返した数（キャッシュの期限は --ttl 秒に縮めて、時間を早送りする）
+#   threads  上記の間のスレッド数の最大値・偽スプレッドシートへの同時呼び出し数の最大値
+#
+# 使い方: python -m benchmarks.bench_sheets_loader [オプション]（オプションは --help を参照）
+#   基準値と比べる:   python -m benchmarks.bench_sheets_loader（悪化した項目があれば終了コード 1）
+#   基準値を更新する: python -m benchmarks.bench_sheets_loader --save-baseline
+#
+# sheets_loader のログは量が多いため、--verbose を付けない限り表示しない
+
+import os
+
+# ベンチマークでは Google・ローカルファイルに触れない（utils の import より前に設定する）
+os.environ.setdefault('SHEETS_SNAPSHOT', '0')
+os.environ.setdefault('SHEETS_CHANGE_CHECK', '0')
+
+import argparse
+import asyncio
+import contextlib
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import gspread
+
+from benchmarks.common import percentile
+from benchmarks.fake_sheets_server import make_quiz_values
+from utils import sheets_loader
+
+# --- 定数 ---
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline_sheets_loader.json')
+# 基準値と比べる項目: 項目名 -> 小さいほど良いか
+COMPARED_METRICS = {
+    'cold_total_ms': True,
+    'cold_p95_ms': True,
+    'warm_p50_us': True,
+    'warm_p95_us': True,
+    'zipf_hit_ratio': False,
+    'zipf_api_fetches': True,
+    'zipf_p95_ms': True,
+    'zipf_unavailable': True,
+    'peak_threads': True,
+}
+# 時間の項目は実行環境でぶれるため、比率の許容幅とは別に、この値未満の差は悪化とみなさない
+ABSOLUTE_SLACK = {'cold_total_ms': 20, 'cold_p95_ms': 20, 'warm_p50_us': 20, 'warm_p95_us': 50, 'zipf_p95_ms': 20,
+                  'zipf_api_fetches': 5, 'zipf_unavailable': 2, 'peak_threads': 2}
+
+
+# 🔽 --- 偽の gspread スプレッドシート --- 🔽
+class FakeWorksheet:
+    def __init__(self, spreadsheet, name: str):
+        self.spreadsheet = spreadsheet
+        self.title = name
+
+    def get_all_records(self):
+        values = self.spreadsheet.call(self.title)
+        return sheets_loader._values_to_records(values)
+
+
+class FakeSpreadsheet:
+    """
+    gspread.Spreadsheet のうち、sheets_loader が使うメソッドだけを持つ偽物
+    sheets: {シート名: values}
+    latency: API呼び出し1回の遅延（秒）。jitter はそのばらつき（割合）
+    failure_rate: API呼び出しが例外になる確率（0〜1）
+    """
+    id = 'fake-spreadsheet'
+
+    def __init__(self, sheets: dict, latency: float, jitter: float = 0.3, failure_rate: float = 0.0, seed: int = 0):
+        self.sheets = sheets
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self.max_concurrent = 0
+        self.threads = set()  # 呼び出し元のスレッド
+        self._concurrent = 0
+        self._lock = threading.Lock()
+
+    def call(self, *sheet_names):
+        """API呼び出し1回分（遅延・失敗を入れて、各シートの values を返す）"""
+        with self._lock:
+            self.calls += 1
+            self._concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self._concurrent)
+            self.threads.add(threading.get_ident())
+            delay = self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            failed = self.random.random() < self.failure_rate
+        try:
+            time.sleep(delay)
+            if failed:
+                with self._lock:
+                    self.failures += 1
+                raise RuntimeError('injected failure (503)')
+            for name in sheet_names:
+                if name not in self.sheets:
+                    raise gspread.WorksheetNotFound(name)
+            return self.sheets[sheet_names[0]] if len(sheet_names) == 1 else [self.sheets[n] for n in sheet_names]
+        finally:
+            with self._lock:
+                self._concurrent -= 1
+
+    def worksheet(self, name: str):
+        if name not in self.sheets:
+            raise gspread.WorksheetNotFound(name)
+        return FakeWorksheet(self, name)
+
+    def values_batch_get(self, ranges):
+        names = [a1_range.strip("'").replace("''", "'") for a1_range in ranges]
+        values_list = self.call(*names)
+        if len(names) == 1:
+            values_list = [values_list]
+        return {'valueRanges': [{'values': values} for values in values_list]}
+
+    def get_lastUpdateTime(self):
+        return '2000-01-01T00:00:00.000Z'
+# 🔼 --- 偽の gspread スプレッドシート --- 🔼
+
+
+def reset_loader(spreadsheet):
+    """sheets_loader のキャッシュ・統計を空にして、偽のスプレッドシートを使わせる"""
+    sheets_loader.g_spreadsheet = spreadsheet
+    sheets_loader.g_cache.clear()
+    sheets_loader.g_parsed_cache.clear()
+    for key in sheets_loader.g_stats:
+        sheets_loader.g_stats[key] = 0
+
+
+async def wait_background_refreshes():
+    while sheets_loader.g_refreshing:
+        await asyncio.sleep(0.01)
+
+
+class ThreadSampler:
+    """イベントループ上で定期的にスレッド数を調べ、最大値を記録する"""
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, threading.active_count())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def bench_cold(sheet_names) -> dict:
+    """キャッシュが空の状態で、全シートを同時に（1シートずつ別の呼び出しで）読み込む"""
+    latencies = []
+
+    async def _load(name):
+        t0 = time.perf_counter()
+        data = (await sheets_loader.aload_sheets_data([name]))[name]
+        latencies.append(time.perf_counter() - t0)
+        assert data, f"シート {name} を読み込めませんでした"
+
+    started = time.perf_counter()
+    await asyncio.gather(*[_load(name) for name in sheet_names])
+    elapsed = time.perf_counter() - started
+    return {
+        'cold_total_ms': round(elapsed * 1000, 1),
+        'cold_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'cold_p95_ms': round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def bench_warm(sheet_names, iterations: int) -> dict:
+    """キャッシュに載っている状態で、load_sheet_data を1回ずつ呼ぶ時間（イベントループを介さない）"""
+    latencies = []
+    for i in range(iterations):
+        name = sheet_names[i % len(sheet_names)]
+        t0 = time.perf_counter()
+        sheets_loader.load_sheet_data(name)
+        latencies.append(time.perf_counter() - t0)
+    return {
+        'warm_p50_us': round(percentile(latencies, 50) * 1e6, 1),
+        'warm_p95_us': round(percentile(latencies, 95) * 1e6, 1),
+    }
+
+
+async def bench_zipf(sheet_names, requests: int, duration: float, s: float, seed: int) -> dict:
+    """人気が Zipf 分布に従うコマンドのリクエストを、duration 秒に均等に流す"""
+    rng = random.Random(seed)
+    weights = [1 / (rank ** s) for rank in range(1, len(sheet_names) + 1)]
+    chosen = rng.choices(sheet_names, weights=weights, k=requests)
+    latencies = []
+    unavailable = 0
+
+    async def _load(name):
+        nonlocal unavailable
+        t0 = time.perf_counter()
+        data = (await sheets_loader.aload_sheets_data([name]))[name]
+        latencies.append(time.perf_counter() - t0)
+        if data is None:
+            unavailable += 1
+
+    started = time.perf_counter()
+    tasks = []
+    for i, name in enumerate(chosen):
+        delay = started + duration * i / requests - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(_load(name)))
+    await asyncio.gather(*tasks)
+    await wait_background_refreshes()
+
+    stats = sheets_loader.get_stats()
+    hits = stats['cache_hits'] + stats['stale_hits']
+    return {
+        'zipf_hit_ratio': round(hits / requests, 4),
+        'zipf_stale_hits': stats['stale_hits'],
+        'zipf_api_fetches': stats['api_fetches'],
+        'zipf_coalesced': stats['coalesced'],
+        'zipf_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'zipf_p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'zipf_unavailable': unavailable,
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """基準値より悪化した項目の説明のリストを返す"""
+    regressions = []
+    for name, lower_is_better in COMPARED_METRICS.items():
+        if name not in results or name not in baseline:
+            continue
+        current, base = results[name], baseline[name]
+        diff = current - base if lower_is_better else base - current
+        if diff > abs(base) * tolerance and diff > ABSOLUTE_SLACK.get(name, 0):
+            regressions.append(f"{name}: {base} → {current}")
+    return regressions
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    sheet_names = [f'quiz_{i}' for i in range(args.sheets)]
+    # シートの行数は --rows を中心に ±50% でばらつかせる
+    sheets = {name: make_quiz_values(max(1, int(args.rows * rng.uniform(0.5, 1.5)))) for name in sheet_names}
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.threads))
+    sheets_loader.SHEETS_BACKEND = 'gspread'
+
+    sampler = ThreadSampler()
+    sampler.start()
+    results = {}
+
+    spreadsheet = FakeSpreadsheet(sheets, args.latency, seed=args.seed)
+    reset_loader(spreadsheet)
+    results.update(await bench_cold(sheet_names))
+    results.update(bench_warm(sheet_names, args.warm_iterations))
+    cold_calls = spreadsheet.calls
+
+    # 時間を早送りするため、キャッシュの期限を --ttl 秒に縮める（期限切れキャッシュを使える時間との比は本番と同じ）
+    staleness_ratio = sheets_loader.CACHE_MAX_STALENESS / sheets_loader.CACHE_EXPIRATION
+    original_expiration = sheets_loader.CACHE_EXPIRATION, sheets_loader.CACHE_MAX_STALENESS
+    sheets_loader.CACHE_EXPIRATION = args.ttl
+    sheets_loader.CACHE_MAX_STALENESS = args.ttl * staleness_ratio
+    zipf_spreadsheet = FakeSpreadsheet(sheets, args.latency, failure_rate=args.failure_rate, seed=args.seed)
+    reset_loader(zipf_spreadsheet)
+    try:
+        results.update(await bench_zipf(sheet_names, args.requests, args.duration, args.zipf, args.seed))
+    finally:
+        sheets_loader.CACHE_EXPIRATION, sheets_loader.CACHE_MAX_STALENESS = original_expiration
+
+    await sampler.stop()
+    results['peak_threads'] = sampler.peak
+    results['peak_concurrent_fetches'] = max(spreadsheet.max_concurrent, zipf_spreadsheet.max_concurrent)
+    results['fetch_threads_used'] = len(spreadsheet.threads | zipf_spreadsheet.threads)
+    results['api_calls_cold'] = cold_calls
+    results['zipf_injected_failures'] = zipf_spreadsheet.failures
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='sheets_loader の性能の回帰テスト（偽の gspread スプレッドシートを使用）')
+    parser.add_argument('--sheets', type=int, default=50, help='シート数（= コマンド数）')
+    parser.add_argument('--rows', type=int, default=100, help='1シートの行数の平均')
+    parser.add_argument('--latency', type=float, default=0.05, help='API呼び出し1回の遅延（秒）')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='zipf で API呼び出しが失敗する確率')
+    parser.add_argument('--threads', type=int, default=min(32, (os.cpu_count() or 1) + 4), help='スレッドプールの大きさ')
+    parser.add_argument('--warm-iterations', type=int, default=5000, help='warm で読み込む回数')
+    parser.add_argument('--requests', type=int, default=3000, help='zipf のリクエスト数')
+    parser.add_argument('--duration', type=float, default=3.0, help='zipf のリクエストを流す秒数')
+    parser.add_argument('--ttl', type=float, default=0.5, help='zipf でのキャッシュの期限（秒）')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf 分布の指数（大きいほど人気が偏る）')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基準値の JSON ファイル')
+    parser.add_argument('--save-baseline', action='store_true', help='今回の結果を基準値として保存する')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='悪化とみなす基準値からの比率')
+    parser.add_argument('--verbose', action='store_true', help='sheets_loader のログを表示する')
+    args = parser.parse_args()
+
+    print(f"[Bench] シート {args.sheets} 件 (平均 {args.rows} 行), API の遅延 {args.latency * 1000:.0f}ms, "
+          f"スレッドプール {args.threads}, zipf: {args.requests} 件/{args.duration}s (s={args.zipf}, 期限 {args.ttl}s, "
+          f"失敗率 {args.failure_rate * 100:.0f}%)")
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, 'w')))
+        results = asyncio.run(run(args))
+
+    for name, value in results.items():
+        print(f"  {name:<26} {value}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"[Bench] 基準値を保存しました: {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"[Bench] 基準値がありません（--save-baseline で作成できます）: {args.baseline}")
+        return 0
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"[Bench] 基準値より悪化した項目があります（許容幅 {args.tolerance * 100:.0f}%）:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print("[Bench] 基準値と比べて悪化した項目はありません。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
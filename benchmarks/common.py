@@ -0,0 +1,53 @@
+# ベンチマーク・負荷試験で共通に使う計測用のクラス
+
+import asyncio
+import os
+import resource
+import time
+
+
+class LoopLagMonitor:
+    """イベントループの遅れ（sleep が予定より何秒遅れて戻ったか）の最大値を測る"""
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.lags = []  # 1回ごとの遅れ（秒）
+        self._task = None
+
+    async def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - t0 - self.interval
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def percentile(values, q: float) -> float:
+    """values の q パーセンタイル（0〜100、最近傍法）。空の場合は 0.0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def current_rss_bytes() -> int:
+    """現在の RSS（常駐メモリ）のバイト数（Linux の /proc を使う）"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def peak_rss_bytes() -> int:
+    """プロセス開始からの RSS の最大値のバイト数（Linux では ru_maxrss は KB 単位）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,125 @@
+# ローカルの偽 Sheets API サーバー
+# (v1.0: Google に接続せずに、非同期クライアント・gspread の並列性能を測るためのもの)
+#
+# 対応しているAPI:
+#   POST /token                                        … 固定のアクセストークンを返す
+#   GET  /v4/spreadsheets/{id}/values:batchGet          … 各シートの値を返す（存在しないシートは 400）
+#   GET  /drive/v3/files/{id}                           … 最終更新時刻（modifiedTime）を返す
+#
+# 単体で起動する場合: python -m benchmarks.fake_sheets_server [ポート] [応答の遅延(秒)]
+
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+
+def make_quiz_values(rows: int):
+    """クイズシートと同じ列構成の値（1行目がヘッダー）を作る"""
+    header = ['question_id', 'text', 'option_1', 'option_2', 'option_3', 'option_4', 'correct_answer', 'explanation']
+    values = [header]
+    for i in range(1, rows + 1):
+        values.append([str(i), f'問題 {i}', 'A案', 'B案', 'C案', 'D案', str(i % 4 + 1), f'解説 {i}'])
+    return values
+
+
+class FakeSheetsServer:
+    """
+    sheets: {シート名: values}
+    latency: 1リクエストあたりの応答の遅延（秒）
+    """
+    def __init__(self, sheets: dict, latency: float = 0.05, spreadsheet_id: str = 'fake-spreadsheet'):
+        self.sheets = sheets
+        self.latency = latency
+        self.spreadsheet_id = spreadsheet_id
+        self.requests = 0
+        self.modified_at = time.time()  # 最終更新時刻（シートを書き換えたら更新すること）
+        self.drive_requests = 0
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._runner = None
+        self.base_url = None
+
+    def _make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/token', self._handle_token)
+        app.router.add_get('/v4/spreadsheets/{spreadsheet_id}/values:batchGet', self._handle_batch_get)
+        app.router.add_get('/drive/v3/files/{file_id}', self._handle_drive_file)
+        return app
+
+    async def _handle_drive_file(self, request):
+        self.drive_requests += 1
+        await asyncio.sleep(self.latency)
+        if request.match_info['file_id'] != self.spreadsheet_id:
+            return web.json_response({'error': {'code': 404, 'message': 'File not found.'}}, status=404)
+        modified = datetime.fromtimestamp(self.modified_at, timezone.utc).isoformat(timespec='milliseconds')
+        return web.json_response({'modifiedTime': modified.replace('+00:00', 'Z')})
+
+    async def _handle_token(self, request):
+        return web.json_response({'access_token': 'fake-token', 'expires_in': 3600, 'token_type': 'Bearer'})
+
+    async def _handle_batch_get(self, request):
+        self.requests += 1
+        self._concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self._concurrent)
+        try:
+            await asyncio.sleep(self.latency)
+            if request.match_info['spreadsheet_id'] != self.spreadsheet_id:
+                return web.json_response({'error': {'code': 404, 'message': 'Requested entity was not found.'}}, status=404)
+            value_ranges = []
+            for a1_range in request.query.getall('ranges', []):
+                name = a1_range.strip("'").replace("''", "'")
+                if name not in self.sheets:
+                    return web.json_response(
+                        {'error': {'code': 400, 'message': f'Unable to parse range: {a1_range}'}}, status=400
+                    )
+                value_ranges.append({'range': a1_range, 'majorDimension': 'ROWS', 'values': self.sheets[name]})
+            return web.json_response({'spreadsheetId': self.spreadsheet_id, 'valueRanges': value_ranges})
+        finally:
+            self._concurrent -= 1
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """サーバーを起動して base_url（…/v4）を返す（port=0 の場合は空いているポートを使う）"""
+        self._runner = web.AppRunner(self._make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        actual_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{actual_port}/v4'
+        return self.base_url
+
+    @property
+    def token_url(self) -> str:
+        return self.base_url[:-len('/v4')] + '/token'
+
+    @property
+    def drive_base_url(self) -> str:
+        return self.base_url[:-len('/v4')] + '/drive/v3'
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve_forever(port: int, latency: float):
+    sheets = {f'quiz_{i}': make_quiz_values(50) for i in range(1, 11)}
+    server = FakeSheetsServer(sheets, latency=latency)
+    base_url = await server.start(port=port)
+    print(f"[FakeSheets] {base_url} で起動しました (spreadsheet: {server.spreadsheet_id}, シート: {list(sheets)})")
+    print(f"[FakeSheets] 例: SHEETS_API_BASE_URL={base_url} SHEETS_SPREADSHEET_ID={server.spreadsheet_id} SHEETS_TOKEN_URL={server.token_url} DRIVE_API_BASE_URL={server.drive_base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8089
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    try:
+        asyncio.run(_serve_forever(port, latency))
+    except KeyboardInterrupt:
+        pass
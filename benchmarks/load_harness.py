@@ -0,0 +1,332 @@
+# QuizView / DiagnosisView の負荷試験（ネットワークなし）
+# (v1.0: Discord の Interaction・followup・メッセージを偽物に置き換え、多数のユーザーに同時にセッションを最後まで進めさせる)
+#
+# - 偽の REST 呼び出し（defer・followup.send・メッセージの編集）は、指定した遅延だけ待ってから返る
+# - 送信・編集は本物と同じく g_rest_scheduler を通るため、同時実行数の上限の影響も含めて測れる
+# - セッションは bot.py と同じく g_session_registry に登録する（--persistent の場合は登録せず、custom_id から復元する）
+# - --audio を付けると音声つきの問題になる。音声のダウンロードは偽の fetch に置き換え、偽の followup.send は
+#   添付ファイルを受け取ると Discord と同じく CDN URL（ex= つき）の attachments を返す（g_media_registry の確認用）
+#
+# 使い方: python -m benchmarks.load_harness [ユーザー数] [オプション]（オプションは --help を参照）
+# 例:     python -m benchmarks.load_harness 2000 --latency 0.08 --think 1.0 --pause 0.2 --ramp 10
+
+import argparse
+import asyncio
+import collections
+import gc
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+import traceback
+import types
+
+import discord
+
+from benchmarks.bench_render import make_quiz_records
+from benchmarks.common import LoopLagMonitor, current_rss_bytes, peak_rss_bytes, percentile
+from utils import http_client, persistent_session
+from utils.diagnosis_view import DiagnosisView, build_diagnosis_deck
+from utils.media_cache import g_media_cache
+from utils.media_registry import g_media_registry
+from utils.quiz_view import QuizView, build_quiz_deck
+from utils.rest_scheduler import g_rest_scheduler
+from utils.session_registry import g_session_registry
+
+
+# 🔽 --- 偽の Discord --- 🔽
+class FakeDiscord:
+    """REST 呼び出しごとに遅延（latency ± jitter の割合）を入れ、種類ごとの回数を数える"""
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = collections.Counter()
+        self.upload_bytes = 0  # 添付ファイルとして受け取ったバイト数
+        self._attachment_ids = itertools.count(1)
+
+    async def call(self, kind: str):
+        self.calls[kind] += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def upload(self, file: discord.File):
+        """添付ファイルを受け取り、Discord の添付ファイルと同じ形（CDN URL は24時間後に期限切れ）で返す"""
+        size = os.fstat(file.fp.fileno()).st_size
+        file.close()
+        self.upload_bytes += size
+        attachment_id = next(self._attachment_ids)
+        url = (f'https://cdn.discordapp.com/ephemeral-attachments/1/{attachment_id}/{file.filename}'
+               f'?ex={int(time.time()) + 86400:x}&is={int(time.time()):x}&hm=fake')
+        return types.SimpleNamespace(id=attachment_id, url=url, size=size, filename=file.filename)
+
+
+class FakeMessage:
+    def __init__(self, user, attachments=()):
+        self.user = user
+        self.attachments = list(attachments)
+
+    async def edit(self, **kwargs):
+        await self.user.api.call('message.edit')
+        self.user.on_message(kwargs)
+        return self
+
+
+class FakeFollowup:
+    def __init__(self, user):
+        self.user = user
+
+    async def send(self, *args, **kwargs):
+        await self.user.api.call('followup.send')
+        attachments = [self.user.api.upload(kwargs['file'])] if kwargs.get('file') else []
+        self.user.on_message(kwargs)
+        return FakeMessage(self.user, attachments)
+
+
+class FakeResponse:
+    def __init__(self, user):
+        self.user = user
+        self._done = False
+
+    async def defer(self, **kwargs):
+        await self.user.api.call('response.defer')
+        self._done = True
+
+    async def send_message(self, *args, **kwargs):
+        await self.user.api.call('response.send_message')
+        self._done = True
+        self.user.on_message(kwargs)
+
+    def is_done(self):
+        return self._done
+
+
+class FakeInteraction:
+    """discord.Interaction のうち、QuizView / DiagnosisView が使う属性だけを持つ偽物"""
+    type = discord.InteractionType.component
+    _ids = itertools.count(1)
+
+    def __init__(self, user, custom_id: str = None):
+        self.id = next(self._ids)
+        self.token = f'token-{self.id}'
+        self.user = types.SimpleNamespace(id=user.user_id, name=f'user{user.user_id}')
+        self.command = types.SimpleNamespace(name=user.command_name)
+        self.data = {'custom_id': custom_id} if custom_id else {'id': '0'}
+        self.response = FakeResponse(user)
+        self.followup = FakeFollowup(user)
+        self._user = user
+
+    async def edit_original_response(self, **kwargs):
+        await self._user.api.call('edit_original_response')
+        self._user.on_message(kwargs)
+# 🔼 --- 偽の Discord --- 🔼
+
+
+class SimulatedUser:
+    """1人のユーザー: コマンドを実行し、表示されたボタンを押し続けて最後まで進める"""
+    def __init__(self, user_id: int, kind: str, deck, api: FakeDiscord, results: dict, args):
+        self.user_id = user_id
+        self.kind = kind
+        self.command_name = 'load_quiz' if kind == 'quiz' else 'load_diagnosis'
+        self.deck = deck
+        self.api = api
+        self.results = results
+        self.args = args
+        self.shown_view = None  # 最後に表示された View（ボタンを押す対象）
+        self.first_message_at = None  # クリック後に最初にメッセージが表示された時刻（= 答え合わせ）
+
+    def on_message(self, kwargs):
+        if self.first_message_at is None:
+            self.first_message_at = time.perf_counter()
+        if 'view' in kwargs:
+            self.shown_view = kwargs['view']
+
+    def _new_view(self, session=None):
+        if self.kind == 'quiz':
+            return QuizView(self.deck, '負荷試験', session=session)
+        return DiagnosisView(self.deck, '負荷試験', session=session)
+
+    async def run(self, start_delay: float):
+        await asyncio.sleep(start_delay)
+        interaction = FakeInteraction(self)
+        started = time.perf_counter()
+        await interaction.response.defer(ephemeral=False)
+
+        session = None
+        if self.args.persistent:
+            if self.kind == 'quiz':
+                session = persistent_session.QuizSession.new(self.command_name, self.deck)
+            else:
+                session = persistent_session.DiagnosisSession.new(self.command_name, self.deck)
+        view = self._new_view(session)
+        if session is None and not await g_session_registry.register(self.user_id, self.command_name, view):
+            self.results['rejected'] += 1
+            return
+        await view.start_with_followup(interaction)
+        self.results['first_question'].append(time.perf_counter() - started)
+        pause = view.ANSWER_REVEAL_SECONDS if self.kind == 'quiz' else view.ANSWER_PAUSE_SECONDS
+
+        while self.shown_view is not None and self.shown_view.children:
+            await asyncio.sleep(random.uniform(0, 2 * self.args.think))
+            button = random.choice([item for item in self.shown_view.children if not item.disabled])
+            click = FakeInteraction(self, button.custom_id)
+            self.first_message_at = None
+            clicked = time.perf_counter()
+            if session is None:
+                await view.button_callback(click)
+            else:
+                resumed = self._new_view(persistent_session.parse_custom_id(button.custom_id))
+                await resumed.resume(click)
+            elapsed = time.perf_counter() - clicked
+            if self.kind == 'quiz' and self.first_message_at is not None:
+                self.results['reveal'].append(self.first_message_at - clicked)
+            if self.shown_view is not None and self.shown_view.children:
+                self.results['next_question'].append(elapsed - pause)
+        self.results['completed'] += 1
+
+
+def make_diagnosis_deck(count: int):
+    questions = [
+        {'question_id': i, 'question_text': f'質問 {i}', 'option_1': 'はい', 'option_2': 'いいえ', 'axis_id': i % 2,
+         'code_1': 'U' if i % 2 else 'L', 'code_2': 'u' if i % 2 else 'l', 'axis_name': '軸'}
+        for i in range(count)
+    ]
+    results = [
+        {'type_id': i, 'type_code': code, 'type_name': f'タイプ {code}', 'conditions': cond,
+         'description': '説明 ' * 20, 'strength': '強み ' * 10, 'weakness': '弱み ' * 10, 'advice': 'アドバイス ' * 10}
+        for i, (code, cond) in enumerate([('UL', 'U>=u,L>=l'), ('Ul', 'U>=u,l>L'), ('uL', 'u>U,L>=l'), ('ul', 'u>U,l>L')])
+    ]
+    return build_diagnosis_deck(questions, results)
+
+
+def _format_latencies(label: str, values: list):
+    if not values:
+        print(f"  {label:<28} (なし)")
+        return
+    ms = [v * 1000 for v in values]
+    print(f"  {label:<28} p50 {percentile(ms, 50):7.1f}ms  p95 {percentile(ms, 95):7.1f}ms  "
+          f"p99 {percentile(ms, 99):7.1f}ms  max {max(ms):7.1f}ms  ({len(ms)} 件)")
+
+
+async def main(args):
+    if args.pause is not None:
+        QuizView.ANSWER_REVEAL_SECONDS = args.pause
+        DiagnosisView.ANSWER_PAUSE_SECONDS = args.pause
+    if args.rest_concurrency:
+        g_rest_scheduler.set_max_concurrent(args.rest_concurrency)
+    g_session_registry.max_active = args.max_sessions or args.users
+    g_session_registry.wait_timeout = args.session_wait
+
+    quiz_records = make_quiz_records(args.questions, with_images=args.images)
+    media_dir = None
+    if args.audio:
+        # 音声は args.audio 種類を使い回す（人気のクイズで同じ音声が何度も出るのと同じ状況）
+        for i, record in enumerate(quiz_records):
+            record['audio_url'] = f'https://media.example.com/audio/{i % args.audio}.mp3'
+        media_dir = tempfile.mkdtemp(prefix='load_harness_media_')
+        g_media_cache.cache_dir = media_dir
+        audio_bytes = b'ID3' + bytes(args.audio_bytes - 3)
+
+        async def fake_fetch_to_file(url, path):
+            await asyncio.sleep(args.latency)
+            with open(path, 'wb') as f:
+                f.write(audio_bytes)
+            return len(audio_bytes)
+        http_client.fetch_to_file = fake_fetch_to_file
+    quiz_deck = build_quiz_deck(quiz_records)
+    diagnosis_deck = make_diagnosis_deck(args.questions)
+    api = FakeDiscord(args.latency, args.jitter)
+    results = {'first_question': [], 'reveal': [], 'next_question': [], 'completed': 0, 'rejected': 0, 'errors': 0}
+
+    diagnosis_users = int(args.users * args.diagnosis)
+    users = [
+        SimulatedUser(i, 'diagnosis' if i < diagnosis_users else 'quiz',
+                      diagnosis_deck if i < diagnosis_users else quiz_deck, api, results, args)
+        for i in range(args.users)
+    ]
+    print(f"[Load] ユーザー {args.users} 人 (クイズ {args.users - diagnosis_users} / 診断 {diagnosis_users}), "
+          f"{args.questions}問, REST の遅延 {args.latency * 1000:.0f}ms±{args.jitter * 100:.0f}%, "
+          f"考える時間 平均 {args.think}s, 待機 {QuizView.ANSWER_REVEAL_SECONDS}s/{DiagnosisView.ANSWER_PAUSE_SECONDS}s, "
+          f"開始を {args.ramp}s に分散, {'永続セッション' if args.persistent else '通常の View'}")
+
+    gc.collect()
+    baseline_rss = current_rss_bytes()
+    baseline_objects = len(gc.get_objects())
+
+    async def _run_user(user, delay):
+        try:
+            await user.run(delay)
+        except Exception:
+            results['errors'] += 1
+            if results['errors'] == 1:
+                traceback.print_exc()
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    tasks = [asyncio.ensure_future(_run_user(user, random.uniform(0, args.ramp))) for user in users]
+
+    # 全員が開始した直後（同時セッション数が最大に近い時点）に、メモリとオブジェクト数を測る
+    await asyncio.sleep(args.ramp + args.latency * 4)
+    await monitor.stop()  # gc.get_objects() による遅れを、ループの遅れに含めない
+    active = len(g_session_registry) if not args.persistent else sum(1 for t in tasks if not t.done())
+    snapshot_rss = current_rss_bytes()
+    snapshot_objects = len(gc.get_objects())
+    monitor.start()
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+
+    print(f"\n--- 結果 ({elapsed:.1f}s) ---")
+    print(f"  完了 {results['completed']} / 拒否 {results['rejected']} / エラー {results['errors']}")
+    _format_latencies('コマンド → 最初の問題', results['first_question'])
+    _format_latencies('クリック → 答え合わせ (クイズ)', results['reveal'])
+    _format_latencies('クリック → 次の問題 (待機を除く)', results['next_question'])
+    lags_ms = [lag * 1000 for lag in monitor.lags]
+    print(f"  {'イベントループの遅れ':<28} p50 {percentile(lags_ms, 50):7.1f}ms  p99 {percentile(lags_ms, 99):7.1f}ms  "
+          f"max {monitor.max_lag * 1000:7.1f}ms")
+
+    per_session = max(active, 1)
+    print(f"  同時セッション数 {active} の時点: RSS +{(snapshot_rss - baseline_rss) / 1024 / 1024:.1f}MB "
+          f"(1セッションあたり {(snapshot_rss - baseline_rss) / per_session / 1024:.1f}KB), "
+          f"オブジェクト 1セッションあたり {(snapshot_objects - baseline_objects) / per_session:.0f} 個")
+    print(f"  RSS の最大値 {peak_rss_bytes() / 1024 / 1024:.1f}MB")
+
+    scheduler = g_rest_scheduler.get_stats()
+    print(f"  REST 呼び出し {sum(api.calls.values())} 件 {dict(api.calls)}")
+    print(f"  REST スケジューラー: 最大キュー長 {scheduler['max_queue_depth']}, 平均待ち {scheduler['avg_queue_wait_ms']}ms "
+          f"(同時実行数の上限 {g_rest_scheduler.limit})")
+    registry = g_session_registry.get_stats()
+    print(f"  セッションの登録簿: 最大同時 {registry['max_active']}, 待機 {registry['waited']}, 拒否 {registry['rejected']}")
+    if args.audio:
+        media = g_media_registry.get_stats()
+        print(f"  音声: アップロード {media['uploads']} 回 ({api.upload_bytes / 1024 / 1024:.1f}MB), "
+              f"CDN URL の使い回し {media['reused']} 回 ({media['bytes_avoided'] / 1024 / 1024:.1f}MB 節約), "
+              f"ダウンロード {g_media_cache.get_stats()['bytes_downloaded'] / 1024 / 1024:.1f}MB")
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='QuizView / DiagnosisView の負荷試験（ネットワークなし）')
+    parser.add_argument('users', type=int, nargs='?', default=1000, help='同時に遊ぶユーザー数')
+    parser.add_argument('--questions', type=int, default=10, help='1セッションの問題数')
+    parser.add_argument('--diagnosis', type=float, default=0.2, help='診断を遊ぶユーザーの割合 (0〜1)')
+    parser.add_argument('--latency', type=float, default=0.08, help='偽の REST 呼び出し1回の遅延（秒）')
+    parser.add_argument('--jitter', type=float, default=0.5, help='遅延のばらつき（割合）')
+    parser.add_argument('--think', type=float, default=1.0, help='ボタンを押すまでの平均秒数')
+    parser.add_argument('--pause', type=float, default=None, help='答え合わせ後の待機秒数（省略時は本番と同じ）')
+    parser.add_argument('--ramp', type=float, default=5.0, help='全員が開始するまでの秒数')
+    parser.add_argument('--images', action='store_true', help='画像つきの選択肢を使う')
+    parser.add_argument('--audio', type=int, default=0, help='音声つきの問題にする（使い回す音声の種類数）')
+    parser.add_argument('--audio-bytes', type=int, default=1024 * 1024, help='音声ファイル1つのバイト数')
+    parser.add_argument('--persistent', action='store_true', help='永続セッション（custom_id に状態を保存）で遊ぶ')
+    parser.add_argument('--rest-concurrency', type=int, default=None, help='REST スケジューラーの同時実行数の上限')
+    parser.add_argument('--max-sessions', type=int, default=None, help='同時セッション数の上限（省略時はユーザー数）')
+    parser.add_argument('--session-wait', type=float, default=10.0, help='上限に達したときに空きを待つ秒数')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
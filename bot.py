@@ -2,27 +2,51 @@
 # Discordボットのエントリーポイント
 # (v21: 診断機能を追加 - クイズと診断の両方に対応)
 
+import time
+g_process_started = time.perf_counter()  # 起動時間の計測の基準（import より前に記録する）
+
 import discord
 from discord import app_commands
 import os
 from dotenv import load_dotenv 
 
-# Flask をインポート
-from flask import Flask
-
 import asyncio 
+import math
 import traceback 
-import threading  # Flaskを別スレッドで起動するため
 
 from utils import sheets_loader  
-from utils.quiz_view import QuizView, QuizData 
+from utils import http_client  # 音声ダウンロード用の共有HTTPクライアント
+from utils.quiz_view import QuizView, build_quiz_deck 
 # 🔽 追加: 診断機能のインポート
-from utils.diagnosis_view import DiagnosisView, DiagnosisQuestion, DiagnosisResult
+from utils.diagnosis_view import DiagnosisView, build_diagnosis_deck
+from utils import persistent_session  # 再起動後も続けられるセッション（PERSISTENT_SESSIONS=1 で有効）
+from utils.session_registry import g_session_registry  # 実行中のセッションの登録簿（同時セッション数の制限）
+from utils import metrics  # /metrics で公開するメトリクス
+from utils import web_server  # ヘルスチェック・メトリクス用の Web サーバー（ボットと同じループで動かす）
+from utils import command_sync  # コマンド構成が変わっていなければ同期を省略する
+
+# 起動時間の内訳（フェーズ名 -> 秒）。on_ready で一覧を表示し、/readyz・/metrics でも返す
+g_startup_phases = {'imports': time.perf_counter() - g_process_started}
+
+
+def record_phase(name: str, started: float):
+    """起動フェーズの所要時間を記録する（started は time.perf_counter() の値）"""
+    g_startup_phases[name] = time.perf_counter() - started
+
+
+metrics.CallbackMetric(
+    'quizbot_startup_phase_seconds', 'Duration of each startup phase.',
+    lambda: {(name,): seconds for name, seconds in g_startup_phases.items()}, labelnames=('phase',)
+)
 
 # --- 設定の読み込み ---
 load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
 GUILD_ID = os.getenv('GUILD_ID') 
+# 起動時にすべてのシートを先読み・検証するか（'0' で無効）
+SHEETS_WARMUP = os.getenv('SHEETS_WARMUP', '1') != '0'
+SHEETS_WARMUP_CONCURRENCY = int(os.getenv('SHEETS_WARMUP_CONCURRENCY', 4))  # 同時に実行する一括取得の数
+SHEETS_WARMUP_BATCH_SIZE = int(os.getenv('SHEETS_WARMUP_BATCH_SIZE', 10))  # 1回の一括取得で読み込むシート数
 
 if not TOKEN:
     print("ERROR: DISCORD_TOKEN が .env ファイルに設定されていません。")
@@ -37,19 +61,19 @@ else:
 # Discord Developer Portal で3つのインテントをONにする
 intents = discord.Intents.all() 
 
-# --- Render (Web Service) 対応 ---
-app = Flask('')
-@app.route('/')
-def health_check():
-    print("[Web Server] Health check OK.")
-    return "Bot is alive!"
+# --- 変換済みデータ（デッキ）の読み込み ---
+# (SHEETS_BACKEND=async の場合はイベントループ上で取得し、スレッドを使わない)
+async def load_quiz_deck(sheet_name: str):
+    """クイズのデッキ（QuizData のタプル）を取得する"""
+    return await sheets_loader.aload_parsed_data(('quiz', sheet_name), [sheet_name], build_quiz_deck)
 
-def run_web_server():
-    """ Flask サーバーを実行する関数 """
-    port = int(os.environ.get('PORT', 10000))
-    print(f"[Web Server] (v21) Flask を起動します (ポート: {port})...")
-    app.run(host='0.0.0.0', port=port)
-# --- Render対応ここまで ---
+async def load_diagnosis_deck(sheet_questions: str, sheet_results: str):
+    """診断のデッキ（DiagnosisDeck）を取得する"""
+    return await sheets_loader.aload_parsed_data(
+        ('diagnosis', sheet_questions, sheet_results),
+        [sheet_questions, sheet_results],
+        build_diagnosis_deck
+    )
 
 
 # --- メインのボットクラス ---
@@ -58,6 +82,25 @@ class MyClient(discord.Client):
     def __init__(self, *, intents: discord.Intents):
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self) 
+        # 登録したコマンドの設定（起動時の先読み・検証で使用）
+        self.command_configs = []
+        # 起動時の検証でデータに問題が見つかったコマンド（command_name -> エラー内容）
+        self.broken_commands = {}
+        # コマンド名 -> 設定（永続セッションのボタンから、シート名・タイトルを引くため）
+        self.command_lookup = {}
+        # コマンド名 -> コマンドID（同期時に取得。クリック可能なコマンドの表示に使う）
+        self.command_ids = {}
+        # スナップショットで起動した場合の、最新の設定との照合タスク
+        self.reconcile_task = None
+        # スナップショットがない場合の、シートの先読みタスク（ログインを待たせないため裏で実行する）
+        self.warm_up_task = None
+        # このプロセスで最後に同期したコマンド構成の指紋（同じなら同期しない）
+        self.synced_fingerprint = None
+        # Gateway への接続を始めた時刻（on_ready までの時間の計測用）
+        self.gateway_started = time.perf_counter()
+        # /readyz で返す状態（コマンドの同期・シートの先読みが済んだか）
+        self.commands_synced = False
+        self.cache_warm = not SHEETS_WARMUP
 
     def _create_quiz_callback(self, sheet_name: str, bot_title: str, allowed_channel_id: str):
         """クイズコマンド用のコールバック関数を生成"""
@@ -84,14 +127,47 @@ class MyClient(discord.Client):
             )
         return _actual_callback
 
+    async def connect(self, *, reconnect: bool = True):
+        """ setup_hook の後、Gateway への接続を始める（起動時間の計測のため時刻を記録する） """
+        self.gateway_started = time.perf_counter()
+        await super().connect(reconnect=reconnect)
+
     async def setup_hook(self):
         """ 起動時、Discord接続「前」に実行される """
         print("[Bot] setup_hook: (v21) 処理を開始します (コマンドのロード)...")
+        
+        # 共有HTTPクライアントを作成（音声ダウンロードで接続を使い回す）
+        await http_client.open_session()
+        
         try:
+            # 🔽 追加: 前回保存したスナップショットがあれば、APIを待たずにすぐコマンドを登録する
+            started = time.perf_counter()
+            restored = await asyncio.to_thread(sheets_loader.restore_snapshot)
+            bot_list = None
+            if restored:
+                bot_list = await asyncio.to_thread(sheets_loader.get_snapshot_bot_master_list)
+            record_phase('snapshot_restore', started)
+            
+            if bot_list:
+                print(f"[Bot] setup_hook: スナップショットから {len(bot_list)} 件のボット設定を読み込みました。")
+                started = time.perf_counter()
+                self.register_commands(bot_list)
+                record_phase('registration', started)
+                print("[Bot] setup_hook: (v21) コマンドのロードが完了しました。(最新の設定は裏で確認します)")
+                # 最新のマスターリストとの照合と先読みは、起動を待たせずに裏で行う
+                self.reconcile_task = asyncio.create_task(self.reconcile_with_live(bot_list))
+                return
+            
+            started = time.perf_counter()
+            await asyncio.to_thread(sheets_loader.connect)
+            record_phase('auth', started)
+            
             print("[Bot] setup_hook: 'bot_master_list' の読み込みを別スレッドで開始...")
+            started = time.perf_counter()
             bot_list = await asyncio.to_thread(
                 sheets_loader.get_bot_master_list
             )
+            record_phase('master_list_fetch', started)
             print("[Bot] setup_hook: 'bot_master_list' の読み込み完了。")
 
             if not bot_list:
@@ -99,80 +175,15 @@ class MyClient(discord.Client):
                 return
 
             print(f"[Bot] {len(bot_list)} 件のボット設定を読み込みました。")
-
-            successful_registrations = 0
-            quiz_count = 0
-            diagnosis_count = 0
-            
-            for bot_config in bot_list:
-                if str(bot_config.get('is_active')).upper() != 'TRUE':
-                    continue
-                
-                bot_type = bot_config.get('type')
-                
-                # クイズの登録
-                if bot_type == 'クイズ':
-                    try:
-                        command_name = bot_config['command_name']
-                        bot_title = bot_config['bot_title']
-                        sheet_name = bot_config['sheet_questions']
-                        allowed_channel_id = str(bot_config.get('allowed_channel_id', ''))
-                        
-                        if not all([command_name, bot_title, sheet_name]):
-                            print(f"[Bot] ERROR: クイズ設定に不備があります: {bot_config}")
-                            continue
-                        
-                        final_callback = self._create_quiz_callback(
-                            sheet_name, bot_title, allowed_channel_id
-                        )
-                        
-                        self.tree.add_command(
-                            app_commands.Command(
-                                name=command_name,
-                                description=f"{bot_title} を開始します。",
-                                callback=final_callback 
-                            ),
-                            guild=MY_GUILD
-                        )
-                        successful_registrations += 1
-                        quiz_count += 1
-                    except Exception as e:
-                        print(f"[Bot] ERROR: クイズの登録に失敗: {bot_config} | Error: {e}")
-                
-                # 🔽 追加: 診断の登録
-                elif bot_type == '診断':
-                    try:
-                        command_name = bot_config['command_name']
-                        bot_title = bot_config['bot_title']
-                        sheet_questions = bot_config['sheet_questions']
-                        sheet_results = bot_config['sheet_results']
-                        allowed_channel_id = str(bot_config.get('allowed_channel_id', ''))
-                        
-                        if not all([command_name, bot_title, sheet_questions, sheet_results]):
-                            print(f"[Bot] ERROR: 診断設定に不備があります: {bot_config}")
-                            continue
-                        
-                        final_callback = self._create_diagnosis_callback(
-                            sheet_questions, sheet_results, bot_title, allowed_channel_id
-                        )
-                        
-                        self.tree.add_command(
-                            app_commands.Command(
-                                name=command_name,
-                                description=f"{bot_title} を開始します。",
-                                callback=final_callback 
-                            ),
-                            guild=MY_GUILD
-                        )
-                        successful_registrations += 1
-                        diagnosis_count += 1
-                    except Exception as e:
-                        print(f"[Bot] ERROR: 診断の登録に失敗: {bot_config} | Error: {e}")
-            
-            print(f"[Bot] setup_hook: {successful_registrations} 件のコマンドを .tree に登録しました。")
-            print(f"[Bot]   - クイズ: {quiz_count} 件")
-            print(f"[Bot]   - 診断: {diagnosis_count} 件")
+            started = time.perf_counter()
+            self.register_commands(bot_list)
+            record_phase('registration', started)
             print("[Bot] setup_hook: (v21) コマンドのロードが完了しました。")
+            
+            # 🔽 追加: すべてのシートを先読みしてキャッシュを温め、データを検証する
+            # (先読みを待つと Discord への接続が遅れるため、裏で行う。終わるまで /readyz は準備中を返す)
+            if SHEETS_WARMUP:
+                self.warm_up_task = asyncio.create_task(self.warm_up_in_background())
 
         except Exception as e:
             print("=================================================================")
@@ -181,9 +192,294 @@ class MyClient(discord.Client):
             traceback.print_exc()
             print("=================================================================")
     
+    def register_commands(self, bot_list):
+        """マスターリストの設定からコマンドを .tree に登録する（登録済みのコマンドは置き換える）"""
+        self.tree.clear_commands(guild=MY_GUILD)
+        self.command_configs = []
+        self.broken_commands = {}
+        self.command_lookup = {}
+        
+        successful_registrations = 0
+        quiz_count = 0
+        diagnosis_count = 0
+        
+        for bot_config in bot_list:
+            if str(bot_config.get('is_active')).upper() != 'TRUE':
+                continue
+            
+            bot_type = bot_config.get('type')
+            
+            # クイズの登録
+            if bot_type == 'クイズ':
+                try:
+                    command_name = bot_config['command_name']
+                    bot_title = bot_config['bot_title']
+                    sheet_name = bot_config['sheet_questions']
+                    allowed_channel_id = str(bot_config.get('allowed_channel_id', ''))
+                    
+                    if not all([command_name, bot_title, sheet_name]):
+                        print(f"[Bot] ERROR: クイズ設定に不備があります: {bot_config}")
+                        continue
+                    
+                    final_callback = self._create_quiz_callback(
+                        sheet_name, bot_title, allowed_channel_id
+                    )
+                    
+                    self.tree.add_command(
+                        app_commands.Command(
+                            name=command_name,
+                            description=f"{bot_title} を開始します。",
+                            callback=final_callback 
+                        ),
+                        guild=MY_GUILD
+                    )
+                    self.command_configs.append({
+                        'type': 'クイズ',
+                        'command_name': command_name,
+                        'sheets': [sheet_name],
+                        'bot_title': bot_title,
+                    })
+                    self.command_lookup[command_name] = self.command_configs[-1]
+                    successful_registrations += 1
+                    quiz_count += 1
+                except Exception as e:
+                    print(f"[Bot] ERROR: クイズの登録に失敗: {bot_config} | Error: {e}")
+            
+            # 🔽 追加: 診断の登録
+            elif bot_type == '診断':
+                try:
+                    command_name = bot_config['command_name']
+                    bot_title = bot_config['bot_title']
+                    sheet_questions = bot_config['sheet_questions']
+                    sheet_results = bot_config['sheet_results']
+                    allowed_channel_id = str(bot_config.get('allowed_channel_id', ''))
+                    
+                    if not all([command_name, bot_title, sheet_questions, sheet_results]):
+                        print(f"[Bot] ERROR: 診断設定に不備があります: {bot_config}")
+                        continue
+                    
+                    final_callback = self._create_diagnosis_callback(
+                        sheet_questions, sheet_results, bot_title, allowed_channel_id
+                    )
+                    
+                    self.tree.add_command(
+                        app_commands.Command(
+                            name=command_name,
+                            description=f"{bot_title} を開始します。",
+                            callback=final_callback 
+                        ),
+                        guild=MY_GUILD
+                    )
+                    self.command_configs.append({
+                        'type': '診断',
+                        'command_name': command_name,
+                        'sheets': [sheet_questions, sheet_results],
+                        'bot_title': bot_title,
+                    })
+                    self.command_lookup[command_name] = self.command_configs[-1]
+                    successful_registrations += 1
+                    diagnosis_count += 1
+                except Exception as e:
+                    print(f"[Bot] ERROR: 診断の登録に失敗: {bot_config} | Error: {e}")
+        
+        print(f"[Bot] {successful_registrations} 件のコマンドを .tree に登録しました。")
+        print(f"[Bot]   - クイズ: {quiz_count} 件")
+        print(f"[Bot]   - 診断: {diagnosis_count} 件")
+    
+    async def reconcile_with_live(self, snapshot_bot_list):
+        """
+        スナップショットで起動した後、最新のマスターリストを取得して照合する
+        設定が変わっていればコマンドを登録し直して同期し、その後シートを先読みする
+        """
+        try:
+            started = time.perf_counter()
+            await asyncio.to_thread(sheets_loader.connect)
+            record_phase('auth', started)
+            print("[Bot] reconcile: 最新の 'bot_master_list' を取得します...")
+            started = time.perf_counter()
+            bot_list = await asyncio.to_thread(sheets_loader.get_bot_master_list)
+            record_phase('master_list_fetch', started)
+            if bot_list and bot_list != snapshot_bot_list:
+                print(f"[Bot] reconcile: マスターリストが変更されていたため、{len(bot_list)} 件の設定でコマンドを登録し直します。")
+                self.register_commands(bot_list)
+                if self.is_ready():
+                    # on_ready の後であれば、ここで同期する（まだなら on_ready が同期する）
+                    await self.sync_commands('reconcile')
+            elif bot_list:
+                print("[Bot] reconcile: マスターリストに変更はありません。")
+            else:
+                print("[Bot] reconcile: WARNING: 最新のマスターリストを取得できないため、スナップショットの設定を使い続けます。")
+            
+            if SHEETS_WARMUP:
+                await self.warm_up_in_background()
+        except Exception as e:
+            print(f"[Bot] reconcile: ERROR: 最新の設定との照合に失敗しました: {e}")
+            traceback.print_exc()
+    
+    async def warm_up_in_background(self):
+        """
+        起動後に裏でシートを先読みする（setup_hook・reconcile_with_live から呼ぶ）
+        データに問題があるコマンドを無効にした場合、on_ready の後であれば Discord 側からも外す
+        """
+        try:
+            started = time.perf_counter()
+            await self.warm_up_sheets()
+            record_phase('warm_up', started)
+            if self.broken_commands and self.is_ready():
+                await self.sync_commands('warm_up')
+        except Exception as e:
+            print(f"[Bot] warm_up: ERROR: シートの先読みに失敗しました: {e}")
+            traceback.print_exc()
+    
+    async def warm_up_sheets(self):
+        """
+        登録したコマンドが使うシートをすべて並列に読み込み（キャッシュに載せ）、
+        QuizData / DiagnosisDeck への変換を検証する（変換済みデータもキャッシュに残る）
+        データに問題があるコマンドは、ユーザーが実行する前にツリーから外す
+        """
+        sheet_names = []
+        for config in self.command_configs:
+            for sheet_name in config['sheets']:
+                if sheet_name not in sheet_names:
+                    sheet_names.append(sheet_name)
+        if not sheet_names:
+            self.cache_warm = True
+            return
+        
+        batches = [
+            sheet_names[i:i + SHEETS_WARMUP_BATCH_SIZE]
+            for i in range(0, len(sheet_names), SHEETS_WARMUP_BATCH_SIZE)
+        ]
+        print(f"[Bot] warm_up: {len(sheet_names)} 件のシートを {len(batches)} 回の一括取得で先読みします (同時 {SHEETS_WARMUP_CONCURRENCY} 件)...")
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(SHEETS_WARMUP_CONCURRENCY)
+        
+        async def _load(batch):
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    batch_data = await sheets_loader.aload_sheets_data(batch)
+                    batch_error = None
+                except Exception as e:
+                    batch_data, batch_error = {}, str(e)
+                elapsed_ms = (time.perf_counter() - t0) * 1000
+                results = []
+                for sheet_name in batch:
+                    data = batch_data.get(sheet_name)
+                    error = batch_error or (None if data else "データを読み込めませんでした")
+                    status = "OK" if error is None else f"ERROR: {error}"
+                    print(f"[Bot] warm_up:   - {sheet_name}: {elapsed_ms:.0f}ms ({len(data) if data else 0} 件) {status}")
+                    results.append((sheet_name, data, error))
+                return results
+        
+        loaded = {}
+        for results in await asyncio.gather(*[_load(batch) for batch in batches]):
+            for sheet_name, data, error in results:
+                loaded[sheet_name] = (data, error)
+        
+        # コマンドごとにデータを検証
+        for config in self.command_configs:
+            command_name = config['command_name']
+            fetch_errors = [f"{name}: {loaded[name][1]}" for name in config['sheets'] if loaded[name][1]]
+            if fetch_errors:
+                # 読み込みの失敗は一時的な可能性があるため、コマンドは残す
+                print(f"[Bot] warm_up: WARNING: /{command_name} のシートを読み込めませんでした: {fetch_errors}")
+                continue
+            try:
+                if config['type'] == 'クイズ':
+                    await load_quiz_deck(*config['sheets'])
+                else:
+                    await load_diagnosis_deck(*config['sheets'])
+            except Exception as e:
+                self.broken_commands[command_name] = str(e)
+                self.tree.remove_command(command_name, guild=MY_GUILD)
+                print(f"[Bot] warm_up: ERROR: /{command_name} のデータ形式が正しくないため、コマンドを無効にしました: {e}")
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"[Bot] warm_up: 先読みが完了しました ({elapsed_ms:.0f}ms, 無効にしたコマンド: {len(self.broken_commands)} 件)")
+        self.cache_warm = True
+    
+    async def sync_commands(self, reason: str):
+        """
+        tree のコマンドを Discord に同期する
+        コマンド構成の指紋が、このプロセスで同期したもの・前回の起動で同期したものと同じなら省略する
+        (tree.sync はレート制限の厳しい一括上書きのため、再起動・再接続のたびに呼ばない)
+        """
+        fingerprint = command_sync.command_fingerprint(self.tree, MY_GUILD, self.application_id)
+        if fingerprint == self.synced_fingerprint:
+            print(f"[Bot] sync ({reason}): コマンド構成に変更がないため、同期を省略します。")
+            return
+        if self.synced_fingerprint is None:
+            state = await asyncio.to_thread(command_sync.load_state)
+            if state and state['fingerprint'] == fingerprint:
+                self.command_ids = state['command_ids']
+                self.synced_fingerprint = fingerprint
+                self.commands_synced = True
+                print(f"[Bot] sync ({reason}): 前回の起動時から変更がないため、同期を省略します。({len(self.command_ids)} 個のコマンド)")
+                return
+        
+        target = f"ギルド {GUILD_ID} に" if MY_GUILD else "グローバルコマンドとして"
+        print(f"[Bot] sync ({reason}): {target}コマンドを同期します...")
+        synced = await self.tree.sync(guild=MY_GUILD)
+        self.command_ids = {command.name: command.id for command in synced}
+        self.synced_fingerprint = fingerprint
+        self.commands_synced = True
+        await asyncio.to_thread(command_sync.save_state, fingerprint, self.command_ids)
+        print(f"[Bot] sync ({reason}): {len(synced)} 個のコマンドを同期しました")
+    
+    def get_readiness(self) -> dict:
+        """/readyz 用の状態（checks がすべて True なら準備完了）"""
+        latency = self.latency
+        return {
+            'checks': {
+                'gateway_connected': self.is_ready() and not self.is_closed() and math.isfinite(latency),
+                'commands_synced': self.commands_synced,
+                'caches_warm': self.cache_warm,
+            },
+            'gateway_latency_ms': round(latency * 1000, 1) if math.isfinite(latency) else None,
+            'commands': len(self.command_configs),
+            'broken_commands': len(self.broken_commands),
+            'active_sessions': len(g_session_registry),
+            'startup_ms': {name: round(seconds * 1000) for name, seconds in g_startup_phases.items()},
+        }
+    
+    async def close(self):
+        """ ボット終了時に共有HTTPクライアントも閉じる """
+        await http_client.close_session()
+        await super().close()
+    
+    async def register_session(self, interaction: discord.Interaction, view) -> bool:
+        """
+        セッションを登録簿に登録する（同じユーザーの古いセッションは終了して置き換える）
+        全体の同時セッション数が上限のままなら、「混雑しています」と表示して False を返す
+        """
+        if view.session is not None:
+            return True  # 永続セッションは View を保持しないため登録しない
+        if await g_session_registry.register(interaction.user.id, interaction.command.name, view):
+            return True
+        await interaction.edit_original_response(
+            content="ただいま混雑しています。しばらくしてから、もう一度お試しください。"
+        )
+        return False
+    
+    async def start_session(self, interaction: discord.Interaction, view, announcement: str):
+        """
+        公開メッセージを表示してセッションを開始する
+        (登録後のどこで失敗しても、View を終了して登録簿から外す)
+        """
+        try:
+            # 🔽 修正: 公開メッセージを edit_original_response で送信
+            await interaction.edit_original_response(content=announcement)
+            # 🔽 修正: セッションを followup で開始（ephemeral）
+            await view.start_with_followup(interaction)
+        except Exception:
+            view.stop()
+            raise
+    
     async def run_quiz_command(self, interaction: discord.Interaction, sheet_name: str, 
                                bot_title: str, allowed_channel_id: str):
         """クイズコマンドの実行処理"""
+        started = time.perf_counter()
         try:
             # 🔽 修正: 公開でdefer（公開メッセージを先に表示するため）
             await interaction.response.defer(ephemeral=False) 
@@ -206,30 +502,33 @@ class MyClient(discord.Client):
                     return
             
             # データの読み込み
-            print(f"[Bot] {interaction.user.name} のために {sheet_name} の読み込みを別スレッドで開始...")
-            questions_data = await asyncio.to_thread(
-                sheets_loader.get_quiz_data, sheet_name
-            )
+            print(f"[Bot] {interaction.user.name} のために {sheet_name} の読み込みを開始...")
+            # (変換済みの QuizData がキャッシュにあれば、そのまま使う)
+            try: 
+                quiz_deck = await load_quiz_deck(sheet_name)
+            except Exception as e:
+                await interaction.edit_original_response(content=f"エラー: クイズデータの形式が正しくありません。(sheet: {sheet_name}): {e}")
+                return
             print(f"[Bot] {sheet_name} の読み込み完了。")
             
-            if not questions_data:
+            if not quiz_deck:
                 await interaction.edit_original_response(content=f"エラー: クイズデータ（{sheet_name}）を読み込めませんでした。")
                 return
             
-            try: 
-                quiz_data_list = [QuizData(q) for q in questions_data]
-            except Exception as e:
-                await interaction.edit_original_response(content=f"エラー: クイズデータの形式が正しくありません。(sheet: {sheet_name}): {e}")
+            # (永続セッションが有効で、状態が custom_id に収まる場合は View を保持しない)
+            session = None
+            if persistent_session.PERSISTENT_SESSIONS:
+                session = persistent_session.QuizSession.new(interaction.command.name, quiz_deck)
+                if not session.fits(len(quiz_deck)):
+                    session = None
+            view = QuizView(quiz_deck, bot_title, session=session)
+            if not await self.register_session(interaction, view):
                 return
             
-            # 🔽 修正: 公開メッセージを edit_original_response で送信
-            await interaction.edit_original_response(
-                content=f"**{interaction.user.mention} が「{bot_title}」に挑戦します！** 🎵"
+            await self.start_session(
+                interaction, view, f"**{interaction.user.mention} が「{bot_title}」に挑戦します！** 🎵"
             )
-            
-            # 🔽 修正: クイズセッションを followup で開始（ephemeral）
-            view = QuizView(quiz_data_list, bot_title)
-            await view.start_with_followup(interaction)
+            metrics.COMMAND_FIRST_QUESTION_SECONDS.observe(time.perf_counter() - started, 'quiz')
             
         except Exception as e:
             print(f"ERROR: run_quiz_command で予期せぬエラー: {e}")
@@ -250,6 +549,7 @@ class MyClient(discord.Client):
                                     sheet_questions: str, sheet_results: str,
                                     bot_title: str, allowed_channel_id: str):
         """診断コマンドの実行処理"""
+        started = time.perf_counter()
         try:
             # 🔽 修正: 公開でdefer（公開メッセージを先に表示するため）
             await interaction.response.defer(ephemeral=False) 
@@ -271,46 +571,36 @@ class MyClient(discord.Client):
                     await interaction.edit_original_response(content=error_message)
                     return
             
-            # 質問データの読み込み
-            print(f"[Bot] {interaction.user.name} のために {sheet_questions} の読み込みを別スレッドで開始...")
-            questions_data = await asyncio.to_thread(
-                sheets_loader.get_diagnosis_data, sheet_questions
-            )
-            print(f"[Bot] {sheet_questions} の読み込み完了。")
-            
-            if not questions_data:
-                await interaction.edit_original_response(content=f"エラー: 診断データ（{sheet_questions}）を読み込めませんでした。")
-                return
-            
-            # 結果データの読み込み
-            print(f"[Bot] {interaction.user.name} のために {sheet_results} の読み込みを別スレッドで開始...")
-            results_data = await asyncio.to_thread(
-                sheets_loader.get_diagnosis_data, sheet_results
-            )
-            print(f"[Bot] {sheet_results} の読み込み完了。")
-            
-            if not results_data:
-                await interaction.edit_original_response(content=f"エラー: 診断結果データ（{sheet_results}）を読み込めませんでした。")
-                return
-            
-            # データのバリデーション
+            # 質問データと結果データの読み込み（1回のAPI呼び出しでまとめて取得）
+            # (変換済みの DiagnosisDeck がキャッシュにあれば、そのまま使う)
+            print(f"[Bot] {interaction.user.name} のために {sheet_questions} / {sheet_results} の読み込みを開始...")
             try: 
-                diagnosis_questions = [DiagnosisQuestion(q) for q in questions_data]
-                diagnosis_results = [DiagnosisResult(r) for r in results_data]
+                diagnosis_deck = await load_diagnosis_deck(sheet_questions, sheet_results)
             except Exception as e:
                 await interaction.edit_original_response(
                     content=f"エラー: 診断データの形式が正しくありません。\n質問シート: {sheet_questions}\n結果シート: {sheet_results}\n詳細: {e}"
                 )
                 return
+            print(f"[Bot] {sheet_questions} / {sheet_results} の読み込み完了。")
             
-            # 🔽 修正: 公開メッセージを edit_original_response で送信
-            await interaction.edit_original_response(
-                content=f"**{interaction.user.mention} が「{bot_title}」を受けています！** 📋"
-            )
+            if not diagnosis_deck:
+                await interaction.edit_original_response(content=f"エラー: 診断データ（{sheet_questions} / {sheet_results}）を読み込めませんでした。")
+                return
             
-            # 🔽 修正: 診断セッションを followup で開始（ephemeral）
-            view = DiagnosisView(diagnosis_questions, diagnosis_results, bot_title)
-            await view.start_with_followup(interaction)
+            # (永続セッションが有効で、状態が custom_id に収まる場合は View を保持しない)
+            session = None
+            if persistent_session.PERSISTENT_SESSIONS:
+                session = persistent_session.DiagnosisSession.new(interaction.command.name, diagnosis_deck)
+                if not session.fits(len(diagnosis_deck.questions)):
+                    session = None
+            view = DiagnosisView(diagnosis_deck, bot_title, session=session)
+            if not await self.register_session(interaction, view):
+                return
+            
+            await self.start_session(
+                interaction, view, f"**{interaction.user.mention} が「{bot_title}」を受けています！** 📋"
+            )
+            metrics.COMMAND_FIRST_QUESTION_SECONDS.observe(time.perf_counter() - started, 'diagnosis')
             
         except Exception as e:
             print(f"ERROR: run_diagnosis_command で予期せぬエラー: {e}")
@@ -326,6 +616,53 @@ class MyClient(discord.Client):
                 except: 
                     pass
 
+    async def on_interaction(self, interaction: discord.Interaction):
+        """
+        永続セッションのボタンを処理する
+        (View を保持していないため、discord.py の View には届かず、ここで状態を custom_id から復元する)
+        """
+        if interaction.type != discord.InteractionType.component:
+            return
+        session = persistent_session.parse_custom_id(interaction.data.get('custom_id', ''))
+        if session is None:
+            return
+        
+        try:
+            config = self.command_lookup.get(session.command_name)
+            if config is None or session.command_name in self.broken_commands:
+                await interaction.response.send_message(
+                    f"このセッションのコマンド（`/{session.command_name}`）は現在利用できません。", ephemeral=True
+                )
+                return
+            
+            if isinstance(session, persistent_session.QuizSession):
+                deck = await load_quiz_deck(*config['sheets'])
+                valid = deck and session.index < len(deck) and session.signature == persistent_session.quiz_deck_signature(deck)
+                view = QuizView(deck, config['bot_title'], session=session) if valid else None
+            else:
+                deck = await load_diagnosis_deck(*config['sheets'])
+                valid = (deck and session.index < len(deck.questions)
+                         and session.signature == persistent_session.diagnosis_deck_signature(deck))
+                view = DiagnosisView(deck, config['bot_title'], session=session) if valid else None
+            
+            if view is None:
+                # シートが更新されて問題が変わった場合は、古いボタンでは続けられない
+                await interaction.response.send_message(
+                    f"内容が更新されたため、このセッションは続けられません。\nもう一度 `/{session.command_name}` から始めてください。",
+                    ephemeral=True
+                )
+                return
+            await view.resume(interaction, command_id=self.command_ids.get(session.command_name, '0'))
+        
+        except Exception as e:
+            print(f"ERROR: 永続セッションの処理で予期せぬエラー: {e}")
+            traceback.print_exc()
+            if not interaction.response.is_done():
+                try: 
+                    await interaction.response.send_message("予期せぬエラーが発生しました。", ephemeral=True)
+                except: 
+                    pass
+
 # --- ボットの実行 ---
 client = MyClient(intents=intents)
 
@@ -334,6 +671,8 @@ async def on_ready():
     """ Discord 接続「後」に実行される """
     print(f'Logged in as {client.user} (ID: {client.user.id})')
     print('------')
+    if 'gateway_ready' not in g_startup_phases:
+        record_phase('gateway_ready', client.gateway_started)
     
     print("[Bot] on_ready: (v21) 処理を開始します (コマンドの同期)...")
     try:
@@ -341,14 +680,13 @@ async def on_ready():
         commands_in_tree = client.tree.get_commands(guild=MY_GUILD)
         print(f"[Bot] on_ready: tree に登録されているコマンド数: {len(commands_in_tree)}")
         
-        if MY_GUILD:
-            print(f"[Bot] on_ready: ギルド {GUILD_ID} にコマンドを同期します...")
-            synced = await client.tree.sync(guild=MY_GUILD)
-            print(f"[Bot] on_ready: {len(synced)} 個のコマンドを同期しました")
-        else:
-            print("[Bot] on_ready: グローバルコマンドとして同期します...")
-            synced = await client.tree.sync()
-            print(f"[Bot] on_ready: {len(synced)} 個のコマンドを同期しました")
+        started = time.perf_counter()
+        await client.sync_commands('on_ready')
+        if 'sync' not in g_startup_phases:
+            record_phase('sync', started)
+            g_startup_phases['total_to_ready'] = time.perf_counter() - g_process_started
+            summary = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in g_startup_phases.items())
+            print(f"[Bot] on_ready: 起動時間の内訳: {summary}")
             
         print("[Bot] on_ready: (v21) ★★★ コマンドの同期が完了しました ★★★")
         
@@ -359,22 +697,22 @@ async def on_ready():
         traceback.print_exc()
         print("=================================================================")
 
-# --- Flask を daemon thread で起動し、ボットをメインループで実行 ---
+# --- Web サーバーとボットを同じイベントループで実行 ---
 async def main():
     """
-    Flask サーバーを daemon thread で起動し、
+    ヘルスチェック用の Web サーバー（Render 対応）を起動し、
     ボットをメイン asyncio ループで実行する
+    (WEB_SERVER=flask の場合は、従来どおり Flask を daemon thread で起動する)
     """
-    print("[Main] (v21) Flask を daemon thread で起動し、ボットをメインループで実行します...")
-    
-    # Flask を別スレッドで起動（daemon=True で、ボット終了時に自動終了）
-    web_thread = threading.Thread(target=run_web_server, daemon=True)
-    web_thread.start()
-    print("[Main] (v21) Flask サーバーを起動しました。")
+    port = int(os.environ.get('PORT', 10000))
+    await web_server.start(port, client.get_readiness)
     
     # ボットをメインループで実行
-    async with client:
-        await client.start(TOKEN)
+    try:
+        async with client:
+            await client.start(TOKEN)
+    finally:
+        await web_server.stop()
 
 if __name__ == "__main__":
     try:
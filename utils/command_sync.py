@@ -0,0 +1,58 @@
+# スラッシュコマンドの同期（tree.sync）を省略するための、登録内容の指紋（fingerprint）
+# (v1.0: 前回同期したコマンド構成をファイルに保存し、変わっていなければ再起動時の同期を省略する)
+#
+# - 指紋はアプリケーションID・対象ギルド・各コマンドの定義（名前・説明・オプションなど）から作る
+# - 同期で返されたコマンドIDも一緒に保存し、同期を省略した場合もクリック可能なコマンドの表示に使う
+# - Discord 側のコマンドを別の手段で変更した場合は、COMMAND_SYNC_FORCE=1 で起動すると必ず同期する
+
+import hashlib
+import json
+import os
+import time
+
+# --- 定数 ---
+COMMAND_SYNC_STATE_PATH = os.getenv('COMMAND_SYNC_STATE_PATH', 'command_sync_state.json')
+COMMAND_SYNC_FORCE = os.getenv('COMMAND_SYNC_FORCE', '0') != '0'
+
+
+def command_fingerprint(tree, guild, application_id) -> str:
+    """tree に登録されているコマンド構成の指紋（SHA-256）を返す"""
+    commands = sorted((command.to_dict() for command in tree.get_commands(guild=guild)), key=lambda c: c['name'])
+    payload = {
+        'application_id': application_id,
+        'guild_id': guild.id if guild else None,
+        'commands': commands,
+    }
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def load_state():
+    """
+    前回同期したときの状態を読み込む
+    戻り値: {'fingerprint': str, 'command_ids': {コマンド名: ID}, 'synced_at': UNIX時間}（ない・壊れている場合は None）
+    """
+    if COMMAND_SYNC_FORCE:
+        return None
+    try:
+        with open(COMMAND_SYNC_STATE_PATH, encoding='utf-8') as f:
+            state = json.load(f)
+        if isinstance(state, dict) and state.get('fingerprint') and isinstance(state.get('command_ids'), dict):
+            return state
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[CommandSync] WARNING: 前回の同期の記録を読み込めません: {e}")
+    return None
+
+
+def save_state(fingerprint: str, command_ids: dict):
+    """同期したコマンド構成の指紋とコマンドIDを保存する（一時ファイルに書いてから置き換える）"""
+    state = {'fingerprint': fingerprint, 'command_ids': command_ids, 'synced_at': int(time.time())}
+    tmp_path = COMMAND_SYNC_STATE_PATH + '.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, COMMAND_SYNC_STATE_PATH)
+    except Exception as e:
+        print(f"[CommandSync] WARNING: 同期の記録を保存できません: {e}")
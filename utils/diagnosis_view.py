@@ -1,8 +1,104 @@
 # 診断用の共通Viewクラス
 # (v1.0: 2軸対応、統合conditions形式、タイムアウト処理対応)
+# (v1.2: conditions を読み込み時にコンパイルし、判定は整数配列の比較だけで行う)
 
 import discord
 import asyncio
+import operator
+import re
+import time
+
+from utils.rest_scheduler import g_rest_scheduler, PRIORITY_HIGH, PRIORITY_LOW
+from utils.persistent_session import DiagnosisSession
+from utils.session_registry import g_session_registry  # 実行中のセッションの登録簿
+from utils import metrics  # /metrics 用のヒストグラム・カウンター
+
+# 🔽 --- conditions（判定条件）の解析とコンパイル --- 🔽
+# 使える演算子（長いものから順に判定する）
+_CONDITION_OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+_OPERATOR_PATTERN = re.compile(r'>=|<=|==|!=|>|<|=')
+_CONSTANT_PATTERN = re.compile(r'^#(\d+)$')  # 定数は # を付けて書く（例: u>=#3）
+_CODE_PATTERN = re.compile(r'^[^\s#!<>=]+$')  # コードは数字だけのもの（01, 1.0 など）も文字列のまま扱う
+# 判定表で列挙するスコア配列の上限（これを超える診断は判定表を作らず、条件を順に評価する）
+MAX_DECISION_TABLE_STATES = 100000
+
+
+def parse_conditions(conditions_str: str) -> tuple:
+    """
+    conditions 文字列を解析する（不正な書式は ValueError）
+    例: "u>=U,l+m>L" → ((('u',), '>=', ('U',)), (('l', 'm'), '>', ('L',)))
+    - 条件はカンマ区切りで、すべて満たした場合に一致
+    - 各辺はコード（選択肢のコード）または定数（#整数）の足し算
+    - コードは見た目が数字でも（例: "01", "1.0"）文字列として扱う（選択肢のコードと同じ書き方で一致させる）
+    """
+    parsed = []
+    for condition in str(conditions_str).split(','):
+        condition = condition.strip()
+        if not condition:
+            raise ValueError(f"空の条件があります: '{conditions_str}'")
+        
+        operators = _OPERATOR_PATTERN.findall(condition)
+        if len(operators) != 1 or operators[0] not in _CONDITION_OPERATORS:
+            raise ValueError(f"条件 '{condition}' には演算子（>=, >, <=, <, ==, !=）を1つだけ書いてください")
+        left, right = condition.split(operators[0])
+        parsed.append((_parse_terms(left, condition), operators[0], _parse_terms(right, condition)))
+    return tuple(parsed)
+
+
+def _parse_terms(side: str, condition: str) -> tuple:
+    """条件の片側（例: "l+m" や "#3"）を項のタプルに分解する（定数は int に変換し、コードは文字列のまま）"""
+    terms = []
+    for term in side.split('+'):
+        term = term.strip()
+        constant = _CONSTANT_PATTERN.match(term)
+        if constant:
+            terms.append(int(constant.group(1)))
+        elif _CODE_PATTERN.match(term):
+            terms.append(term)
+        else:
+            raise ValueError(f"条件 '{condition}' の '{term}' はコードまたは定数（#整数）ではありません")
+    return tuple(terms)
+
+
+def compile_conditions(parsed: tuple, code_index: dict) -> tuple:
+    """
+    parse_conditions の結果を、コード番号（code_index）で評価できる形に変換する
+    各条件は「左辺 - 右辺 (演算子) 0」の形: (足すコード番号, 引くコード番号, 定数, 比較関数)
+    """
+    compiled = []
+    for left, op, right in parsed:
+        plus, minus, constant = [], [], 0
+        for terms, indices, sign in ((left, plus, 1), (right, minus, -1)):
+            for term in terms:
+                if isinstance(term, int):
+                    constant += sign * term
+                elif term in code_index:
+                    indices.append(code_index[term])
+                else:
+                    raise ValueError(f"条件のコード '{term}' は質問シートのどの選択肢にもありません")
+        compiled.append((tuple(plus), tuple(minus), constant, _CONDITION_OPERATORS[op]))
+    return tuple(compiled)
+
+
+def conditions_match(compiled: tuple, scores: list) -> bool:
+    """コンパイル済みの条件を、コード番号ごとのカウント（scores）で評価する"""
+    for plus, minus, constant, compare in compiled:
+        total = constant
+        for i in plus:
+            total += scores[i]
+        for i in minus:
+            total -= scores[i]
+        if not compare(total, 0):
+            return False
+    return True
+
 
 # 🔽 --- 質問データを扱うクラス --- 🔽
 class DiagnosisQuestion:
@@ -46,27 +142,280 @@ class DiagnosisResult:
         # バリデーション
         if not all([self.type_code, self.type_name, self.conditions]):
             raise ValueError(f"結果データに不足があります (ID: {self.type_id}): {record}")
+        
+        # 🔽 conditions の書式をここで検証する（不正な行が全員に一致してしまうのを防ぐ）
+        try:
+            self.parsed_conditions = parse_conditions(self.conditions)
+        except ValueError as e:
+            raise ValueError(f"結果データの conditions が正しくありません (ID: {self.type_id}): {e}")
+
+
+# 🔽 --- 診断1つ分のデータ（質問 + 結果）をまとめるクラス --- 🔽
+class DiagnosisDeck:
+    """
+    1つの診断の質問と結果をまとめたもの
+    sheets_loader.load_parsed_data でキャッシュされ、全セッションで共有される（変更しない）
+    """
+    def __init__(self, questions: list[DiagnosisQuestion], results: list[DiagnosisResult]):
+        self.questions = tuple(questions)
+        self.results = tuple(results)
+        
+        if not self.questions or not self.results:
+            raise ValueError("診断データに質問または結果が1件もありません")
+        
+        # コード（例: 'U', 'u'）→ スコア配列の番号
+        self.code_index = {}
+        for question in self.questions:
+            for code in (question.code_1, question.code_2):
+                if code not in self.code_index:
+                    self.code_index[code] = len(self.code_index)
+        
+        # 各質問の (選択肢1のコード番号, 選択肢2のコード番号)
+        self.answer_indices = tuple(
+            (self.code_index[q.code_1], self.code_index[q.code_2]) for q in self.questions
+        )
+        
+        # 各結果の conditions をコンパイル（results と同じ順番）
+        compiled = []
+        for result in self.results:
+            try:
+                compiled.append(compile_conditions(result.parsed_conditions, self.code_index))
+            except ValueError as e:
+                raise ValueError(f"結果データの conditions が正しくありません (ID: {result.type_id}): {e}")
+        self.compiled_conditions = tuple(compiled)
+        
+        # 🔽 判定表: 到達しうるスコア配列 → 結果 を読み込み時に作っておく
+        self.decision_table = None
+        self.unreachable_results = ()  # どのスコアでも選ばれない結果
+        self.fallthrough_vectors = ()  # どの条件にも一致しないスコア（results[0] になってしまう）
+        self._build_decision_table()
+        
+        # 🔽 表示用のテンプレート（bot_title ごと。get_templates で初回に作成）
+        self._templates = {}
+
+    def _reachable_scores(self):
+        """全員の回答パターンから、到達しうるスコア配列をすべて列挙する（多すぎる場合は None）"""
+        states = {(0,) * len(self.code_index)}
+        for code_1_index, code_2_index in self.answer_indices:
+            next_states = set()
+            for state in states:
+                for index in (code_1_index, code_2_index):
+                    scores = list(state)
+                    scores[index] += 1
+                    next_states.add(tuple(scores))
+            if len(next_states) > MAX_DECISION_TABLE_STATES:
+                return None
+            states = next_states
+        return states
+
+    def _build_decision_table(self):
+        """判定表を作り、到達できない結果・どれにも一致しないスコアを報告する"""
+        states = self._reachable_scores()
+        if states is None:
+            print(f"[DiagnosisView] スコアの組み合わせが多すぎるため（{MAX_DECISION_TABLE_STATES} 超）、判定表は作りません。")
+            return
+        
+        table = {}
+        chosen = set()
+        fallthrough = []
+        for state in sorted(states):
+            for i, compiled in enumerate(self.compiled_conditions):
+                if conditions_match(compiled, state):
+                    table[state] = i
+                    chosen.add(i)
+                    break
+            else:
+                table[state] = 0  # 従来どおり最初の結果
+                fallthrough.append(state)
+        
+        self.decision_table = table
+        self.unreachable_results = tuple(r for i, r in enumerate(self.results) if i not in chosen)
+        codes = list(self.code_index)
+        self.fallthrough_vectors = tuple(dict(zip(codes, state)) for state in fallthrough)
+        
+        for result in self.unreachable_results:
+            print(f"[DiagnosisView] WARNING: 結果 '{result.type_name}' (ID: {result.type_id}) はどの回答でも選ばれません。conditions: {result.conditions}")
+        if fallthrough:
+            print(f"[DiagnosisView] WARNING: {len(fallthrough)} 通りのスコアがどの conditions にも一致せず、'{self.results[0].type_name}' になります。例: {self.fallthrough_vectors[0]}")
+
+    def lookup_result_index(self, scores: list) -> int:
+        """スコア配列から結果の番号を返す（判定表があれば O(1)、なければ conditions を順に評価）"""
+        if self.decision_table is not None:
+            index = self.decision_table.get(tuple(scores))
+            if index is not None:
+                return index
+        
+        for i, compiled in enumerate(self.compiled_conditions):
+            if conditions_match(compiled, scores):
+                return i
+        
+        # 該当する結果がない場合（通常は起こらないはず）
+        # デフォルトで最初の結果を返す
+        return 0
+
+    def lookup_result(self, scores: list) -> DiagnosisResult:
+        """スコア配列から結果を返す"""
+        return self.results[self.lookup_result_index(scores)]
+
+    def get_templates(self, bot_title: str) -> 'DiagnosisTemplates':
+        """
+        質問・結果の Embed を返す（bot_title ごとに初回だけ作成し、全セッションで共有する）
+        診断は質問の順番が固定のため、質問の Embed もセッションごとの値を含まない
+        """
+        templates = self._templates.get(bot_title)
+        if templates is None:
+            templates = DiagnosisTemplates(
+                tuple(_build_question_embed(bot_title, i, len(self.questions), q) for i, q in enumerate(self.questions)),
+                tuple(_build_result_embed(bot_title, r) for r in self.results),
+            )
+            self._templates[bot_title] = templates
+        return templates
+
+
+class DiagnosisTemplates:
+    """
+    1つの診断（+ bot_title）の表示用 Embed
+    全ユーザー・全セッションで共有するため、変更しないこと
+    """
+    __slots__ = ('question_embeds', 'result_embeds')
+
+    def __init__(self, question_embeds: tuple, result_embeds: tuple):
+        self.question_embeds = question_embeds  # questions と同じ順番
+        self.result_embeds = result_embeds  # results と同じ順番
+
+
+def _build_question_embed(bot_title: str, index: int, total: int, question: DiagnosisQuestion) -> discord.Embed:
+    """
+    質問のEmbed（埋め込みメッセージ）を作成する
+    """
+    embed = discord.Embed(
+        title=f"【{bot_title}】 - 質問 {index + 1}/{total}",
+        description=f"**{question.question_text}**",
+        color=discord.Color.blue()
+    )
+    
+    # 軸の情報を追加（オプション）
+    if question.axis_name:
+        embed.set_footer(text=f"判定項目: {question.axis_name}")
+    
+    return embed
+
+
+def _build_result_embed(bot_title: str, result: DiagnosisResult) -> discord.Embed:
+    """
+    結果発表のEmbedを作成する
+    """
+    result_embed = discord.Embed(
+        title=f"【{bot_title}】 - 診断結果",
+        description=f"✨ **{result.type_name}** ✨\n\n{result.description}",
+        color=discord.Color.gold()
+    )
+    
+    # 詳細情報をフィールドとして追加
+    if result.strength:
+        result_embed.add_field(
+            name="💪 あなたの強み",
+            value=result.strength,
+            inline=False
+        )
+    
+    if result.weakness:
+        result_embed.add_field(
+            name="⚠️ 改善ポイント",
+            value=result.weakness,
+            inline=False
+        )
+    
+    if result.advice:
+        result_embed.add_field(
+            name="📝 アドバイス",
+            value=result.advice,
+            inline=False
+        )
+    
+    # 画像がある場合は設定（オプション）
+    # if result.image_url:
+    #     result_embed.set_thumbnail(url=result.image_url)
+    
+    return result_embed
+
+
+def build_diagnosis_deck(questions_records: list, results_records: list) -> DiagnosisDeck:
+    """
+    質問シートと結果シートの records から DiagnosisDeck を作成する
+    """
+    questions = [DiagnosisQuestion(q) for q in questions_records]
+    results = [DiagnosisResult(r) for r in results_records]
+    return DiagnosisDeck(questions, results)
 
 
 # 🔽 --- DiagnosisView クラス --- 🔽
 class DiagnosisView(discord.ui.View):
     """診断用の共通Viewクラス"""
 
-    def __init__(self, questions_data: list[DiagnosisQuestion], 
-                 results_data: list[DiagnosisResult], bot_title: str):
-        super().__init__(timeout=300.0)  # 5分でタイムアウト
-        self.questions = questions_data  # 質問はシャッフルしない（順番通り）
-        self.results = results_data
+    # 回答してから次の質問に進むまでの秒数
+    ANSWER_PAUSE_SECONDS = 0.5
+
+    def __init__(self, deck: DiagnosisDeck, bot_title: str, session: DiagnosisSession = None):
+        """
+        session を指定した場合は永続セッション (v1.5):
+        状態はボタンの custom_id に保存し、この View はボタン1回分の処理が終われば捨てる
+        """
+        super().__init__(timeout=None if session else 300.0)  # 5分でタイムアウト
+        self.session = session
+        self.deck = deck
+        self.questions = deck.questions  # 質問はシャッフルしない（順番通り）
+        self.results = deck.results
         self.bot_title = bot_title
+        # 質問・結果のEmbed（全セッションで共有するテンプレート）
+        self.templates = deck.get_templates(bot_title)
         
         # View 自身が状態を持つ
         self.current_question_index = 0
         self.interaction = None  # start() で interaction を保持
         self.followup_message = None  # 🔽 追加: followup メッセージを保持
+        self.followup_token = None  # followup_message を送信したインタラクションのトークン（レート制限のバケット）
+        
+        # スコア集計用の配列（各コードのカウント、番号は deck.code_index）
+        # 例: code_index が {'U': 0, 'u': 1, 'L': 2, 'l': 3} なら [3, 3, 4, 2]
+        self.scores = [0] * len(deck.code_index)
+        # 回答の記録（i ビット目 = i 問目で選択肢2を選んだか）
+        self.choice_bits = 0
+        # 永続セッションで、押されたボタンのメッセージを編集対象にするか
+        self._edit_clicked_message = False
         
-        # スコア集計用の辞書（各コードのカウント）
-        # 例: {'U': 3, 'u': 3, 'L': 4, 'l': 2}
-        self.score_dict = {}
+        if session:
+            # custom_id の回答の記録からスコアを計算し直す
+            self.current_question_index = session.index
+            self.choice_bits = session.choice_bits
+            for i in range(min(session.index, len(self.questions))):
+                self.scores[deck.answer_indices[i][session.choice_bits >> i & 1]] += 1
+            # 送信時に View が保持されないよう、最初から終了済みにしておく（ボタンは on_interaction で処理）
+            super().stop()
+
+    def stop(self):
+        """View を終了する（登録簿から外し、デッキへの参照を手放す）"""
+        g_session_registry.release(self)
+        super().stop()
+        self._release_deck()
+
+    def _release_deck(self):
+        """終了したセッションが、共有のデッキ・テンプレートを保持し続けないようにする"""
+        self.deck = self.templates = None
+        self.questions = self.results = []
+
+    async def resume(self, interaction: discord.Interaction, command_id='0'):
+        """永続セッションのボタンが押されたときの処理（bot.py の on_interaction から呼ばれる）"""
+        self.command_name = self.session.command_name
+        self.command_id = command_id
+        self._edit_clicked_message = True
+        await self.button_callback(interaction)
+
+    def _option_custom_id(self, choice: int) -> str:
+        """選択肢ボタンの custom_id（永続セッションの場合は状態を含める）"""
+        if self.session is None:
+            return f"option_{choice}"
+        return self.session.custom_id(self.current_question_index, self.choice_bits, choice)
 
     async def start(self, interaction: discord.Interaction):
         """
@@ -92,19 +441,10 @@ class DiagnosisView(discord.ui.View):
 
     def create_embed(self, question: DiagnosisQuestion):
         """
-        質問のEmbed（埋め込みメッセージ）を作成する
+        現在の質問のEmbed（埋め込みメッセージ）を返す
+        (v1.4: DiagnosisDeck.get_templates で作成済みの共有テンプレート。変更しないこと)
         """
-        embed = discord.Embed(
-            title=f"【{self.bot_title}】 - 質問 {self.current_question_index + 1}/{len(self.questions)}",
-            description=f"**{question.question_text}**",
-            color=discord.Color.blue()
-        )
-        
-        # 軸の情報を追加（オプション）
-        if question.axis_name:
-            embed.set_footer(text=f"判定項目: {question.axis_name}")
-        
-        return embed
+        return self.templates.question_embeds[self.current_question_index]
 
     def update_buttons(self, question: DiagnosisQuestion):
         """
@@ -117,7 +457,7 @@ class DiagnosisView(discord.ui.View):
         button1 = discord.ui.Button(
             label=question.option_1,
             style=discord.ButtonStyle.primary,
-            custom_id="option_1"
+            custom_id=self._option_custom_id(1)
         )
         button1.callback = self.button_callback
         self.add_item(button1)
@@ -126,7 +466,7 @@ class DiagnosisView(discord.ui.View):
         button2 = discord.ui.Button(
             label=question.option_2,
             style=discord.ButtonStyle.secondary,
-            custom_id="option_2"
+            custom_id=self._option_custom_id(2)
         )
         button2.callback = self.button_callback
         self.add_item(button2)
@@ -140,7 +480,18 @@ class DiagnosisView(discord.ui.View):
         embed = self.create_embed(question)
         self.update_buttons(question)
         
-        await self.interaction.edit_original_response(embed=embed, view=self)
+        await self._edit_message(PRIORITY_HIGH, embed=embed, view=self)
+
+    async def _edit_message(self, priority, **kwargs):
+        """
+        表示中のメッセージ（followup_message、なければ元の応答）を編集する
+        (v1.3: REST スケジューラー経由で、同じメッセージへの編集は順番に1つずつ送る)
+        """
+        if self.followup_message:
+            return await g_rest_scheduler.submit(self.followup_token, priority, self.followup_message.edit, **kwargs)
+        return await g_rest_scheduler.submit(
+            self.interaction.token, priority, self.interaction.edit_original_response, **kwargs
+        )
 
     # 🔽 追加: followup でセッションを表示する新しいメソッド
     async def show_question_with_followup(self):
@@ -151,24 +502,27 @@ class DiagnosisView(discord.ui.View):
         embed = self.create_embed(question)
         self.update_buttons(question)
         
-        if self.followup_message is None:
+        if self.followup_message is None and not self._edit_clicked_message:
             # 最初の質問: followup.send で送信
-            self.followup_message = await self.interaction.followup.send(
+            self.followup_message = await g_rest_scheduler.submit(
+                self.interaction.token, PRIORITY_HIGH, self.interaction.followup.send,
                 embed=embed,
                 view=self,
                 ephemeral=True,
                 wait=True
             )
+            self.followup_token = self.interaction.token
         else:
             # 2問目以降: followup メッセージを編集
-            await self.followup_message.edit(embed=embed, view=self)
+            await self._edit_message(PRIORITY_HIGH, embed=embed, view=self)
 
     async def button_callback(self, interaction: discord.Interaction):
         """
         いずれかの選択肢ボタンが押されたときの処理
         """
         # タイムアウトチェック
-        if self.is_finished():
+        # (永続セッションは View を保持しないため、ボタンを表示した時刻で判定する)
+        if self.session.is_expired() if self.session else self.is_finished():
             await interaction.response.send_message(
                 f"⏰ この診断セッションは時間切れで終了しました。\n再度診断を受ける場合は </{self.command_name}:{self.command_id}> をクリックしてください。",
                 ephemeral=True
@@ -178,139 +532,66 @@ class DiagnosisView(discord.ui.View):
         # 操作対象を更新
         self.interaction = interaction
         await interaction.response.defer()
+        # 応答中に終了した（新しいセッションに置き換えられた・タイムアウトした）場合は、デッキを手放しているため何もしない
+        if self.session is None and self.is_finished():
+            return
         
-        question = self.questions[self.current_question_index]
         selected_option = interaction.data['custom_id']  # "option_1" or "option_2"
+        if self.session:
+            selected_option = f"option_{self.session.choice}"
         
-        # 選択されたコードを記録
+        # 選択されたコードのカウントを加算
+        code_1_index, code_2_index = self.deck.answer_indices[self.current_question_index]
         if selected_option == "option_1":
-            selected_code = question.code_1
+            self.scores[code_1_index] += 1
         else:
-            selected_code = question.code_2
-        
-        # スコア辞書に加算
-        if selected_code not in self.score_dict:
-            self.score_dict[selected_code] = 0
-        self.score_dict[selected_code] += 1
+            self.scores[code_2_index] += 1
+            self.choice_bits |= 1 << self.current_question_index
         
         # 短い待機時間（ユーザー体験向上）
-        await asyncio.sleep(0.5)
+        await asyncio.sleep(self.ANSWER_PAUSE_SECONDS)
+        
+        # 待機中に終了した（新しいセッションに置き換えられた・タイムアウトした）場合は、次の質問に進まない
+        if self.session is None and self.is_finished():
+            return
         
         # 次の質問へ
         self.current_question_index += 1
         if self.current_question_index < len(self.questions):
-            if self.followup_message:
+            next_started = time.perf_counter()
+            if self.followup_message or self._edit_clicked_message:
                 await self.show_question_with_followup()
             else:
                 await self.show_question()
+            metrics.NEXT_QUESTION_SECONDS.observe(time.perf_counter() - next_started, 'diagnosis')
         else:
             await self.show_result()
 
     def determine_result(self) -> DiagnosisResult:
         """
         スコアから結果タイプを判定する
-        conditions を解析して、該当する結果を返す
-        """
-        for result in self.results:
-            if self.check_conditions(result.conditions):
-                return result
-        
-        # 該当する結果がない場合（通常は起こらないはず）
-        # デフォルトで最初の結果を返す
-        return self.results[0]
-    
-    def check_conditions(self, conditions_str: str) -> bool:
-        """
-        conditions 文字列を解析して、条件を満たすかチェック
-        
-        例: "u>=U,l>=L"
-        → u のカウント >= U のカウント AND l のカウント >= L のカウント
+        読み込み時に作った判定表（DiagnosisDeck.decision_table）を引くだけ
         """
-        # 条件をカンマで分割
-        conditions_list = [c.strip() for c in conditions_str.split(',')]
-        
-        for condition in conditions_list:
-            # 条件を解析（例: "u>=U"）
-            if '>=' in condition:
-                left, right = condition.split('>=')
-                left = left.strip()
-                right = right.strip()
-                
-                # スコアを取得（存在しない場合は0）
-                left_score = self.score_dict.get(left, 0)
-                right_score = self.score_dict.get(right, 0)
-                
-                # 条件チェック
-                if not (left_score >= right_score):
-                    return False
-            
-            elif '>' in condition:
-                left, right = condition.split('>')
-                left = left.strip()
-                right = right.strip()
-                
-                left_score = self.score_dict.get(left, 0)
-                right_score = self.score_dict.get(right, 0)
-                
-                if not (left_score > right_score):
-                    return False
-            
-            # 他の演算子（<, <=, ==）も必要に応じて追加可能
-        
-        # すべての条件を満たした
-        return True
+        return self.deck.lookup_result(self.scores)
 
     async def show_result(self):
         """
         最終結果を表示する
         """
-        # 結果を判定
-        result = self.determine_result()
-        
-        # 結果発表のEmbed
-        result_embed = discord.Embed(
-            title=f"【{self.bot_title}】 - 診断結果",
-            description=f"✨ **{result.type_name}** ✨\n\n{result.description}",
-            color=discord.Color.gold()
-        )
-        
-        # 詳細情報をフィールドとして追加
-        if result.strength:
-            result_embed.add_field(
-                name="💪 あなたの強み",
-                value=result.strength,
-                inline=False
-            )
-        
-        if result.weakness:
-            result_embed.add_field(
-                name="⚠️ 改善ポイント",
-                value=result.weakness,
-                inline=False
-            )
-        
-        if result.advice:
-            result_embed.add_field(
-                name="📝 アドバイス",
-                value=result.advice,
-                inline=False
-            )
-        
-        # 画像がある場合は設定（オプション）
-        # if result.image_url:
-        #     result_embed.set_thumbnail(url=result.image_url)
+        # 結果を判定（結果発表のEmbedは結果タイプごとに作成済みのものを使う）
+        result_index = self.deck.lookup_result_index(self.scores)
+        result = self.results[result_index]
+        result_embed = self.templates.result_embeds[result_index]
         
         self.clear_items()  # 全てのボタンを削除
         
         # 🔽 修正: followup_message がある場合はそれを編集
-        if self.followup_message:
-            await self.followup_message.edit(embed=result_embed, view=self)
-        else:
-            await self.interaction.edit_original_response(embed=result_embed, view=self)
+        await self._edit_message(PRIORITY_HIGH, embed=result_embed, view=self)
         
         # 🔽 追加: YouTube動画URLがある場合、別メッセージとして送信（Discord内で埋め込み表示）
         if result.youtube_url and result.youtube_url.strip():
-            await self.interaction.followup.send(
+            await g_rest_scheduler.submit(
+                self.interaction.token, PRIORITY_LOW, self.interaction.followup.send,
                 f"📺 **参考動画はこちら:**\n{result.youtube_url}",
                 ephemeral=True  # 本人のみに表示
             )
@@ -321,6 +602,7 @@ class DiagnosisView(discord.ui.View):
         """
         タイムアウト時の処理（5分経過）
         """
+        g_session_registry.release(self, 'timed_out')
         for item in self.children:
             item.disabled = True
         
@@ -331,9 +613,26 @@ class DiagnosisView(discord.ui.View):
         )
         
         try:
-            if self.followup_message:
-                await self.followup_message.edit(embed=timeout_embed, view=self)
-            else:
-                await self.interaction.edit_original_response(embed=timeout_embed, view=self)
+            await self._edit_message(PRIORITY_LOW, embed=timeout_embed, view=self)
+        except:
+            pass  # メッセージが削除されている場合などのエラーを無視
+        self._release_deck()
+
+    async def on_superseded(self):
+        """
+        同じユーザーが新しいセッションを開始したため、このセッションが終了したときの処理
+        (SessionRegistry から呼ばれる。View はすでに終了済み)
+        """
+        for item in self.children:
+            item.disabled = True
+        
+        superseded_embed = discord.Embed(
+            title="🔁 セッション終了",
+            description="新しいセッションを開始したため、この診断セッションは終了しました。",
+            color=discord.Color.light_grey()
+        )
+        
+        try:
+            await self._edit_message(PRIORITY_LOW, embed=superseded_embed, view=self)
         except:
             pass  # メッセージが削除されている場合などのエラーを無視
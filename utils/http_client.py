@@ -0,0 +1,164 @@
+# 外部メディア取得用の共有HTTPクライアント
+# (v1.0: ボット全体で1つの aiohttp.ClientSession を使い回し、DNS/TCP/TLS の接続を再利用する)
+
+import asyncio
+import os
+
+import aiohttp
+
+from utils import metrics
+
+# --- 定数 ---
+HTTP_LIMIT = int(os.getenv('HTTP_LIMIT', 32))  # 全体の同時接続数
+HTTP_LIMIT_PER_HOST = int(os.getenv('HTTP_LIMIT_PER_HOST', 8))  # ホストごとの同時接続数
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 60))  # 接続を使い回す時間（秒）
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 10))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', 60))
+HTTP_MAX_DOWNLOAD_BYTES = int(os.getenv('HTTP_MAX_DOWNLOAD_BYTES', 8 * 1024 * 1024))  # 8MB（Discord の添付ファイルの上限より小さくする）
+HTTP_CHUNK_SIZE = 64 * 1024
+HTTP_SPOOL_BYTES = int(os.getenv('HTTP_SPOOL_BYTES', 512 * 1024))  # ファイルに書き出すまでメモリに溜める量（ダウンロード1件あたり）
+MAGIC_BYTES_LENGTH = 12  # 形式の確認に使う先頭のバイト数
+# 音声として受け付ける、audio/ 以外の Content-Type（種類不明のバイナリとして返すサーバーがあるため）
+AUDIO_GENERIC_CONTENT_TYPES = ('application/octet-stream', 'binary/octet-stream', 'application/ogg')
+
+g_session = None
+g_stats = {
+    'requests': 0,
+    'connections_created': 0,  # 新規接続（= TCP/TLSハンドシェイク）の回数
+    'connections_reused': 0,  # keep-alive で使い回した回数
+    'too_large': 0,
+    'rejected': 0,  # 音声ではない（Content-Type・先頭のバイト列）・HTTP エラーで中断した回数
+}
+
+
+async def _on_connection_create_end(session, context, params):
+    g_stats['connections_created'] += 1
+
+
+async def _on_connection_reuseconn(session, context, params):
+    g_stats['connections_reused'] += 1
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300,
+    )
+    timeout = aiohttp.ClientTimeout(total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config])
+
+
+async def open_session() -> aiohttp.ClientSession:
+    """共有セッションを作成する（MyClient.setup_hook から呼ばれる）"""
+    global g_session
+    if g_session is None or g_session.closed:
+        g_session = _create_session()
+        print(f"[HttpClient] 共有HTTPセッションを作成しました (上限: {HTTP_LIMIT}, ホストごと: {HTTP_LIMIT_PER_HOST})")
+    return g_session
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    共有セッションを返す
+    (setup_hook を通らない場合に備えて、未作成なら実行中のループ上で作成する)
+    """
+    global g_session
+    if g_session is None or g_session.closed:
+        g_session = _create_session()
+        print("[HttpClient] 共有HTTPセッションを作成しました (遅延作成)")
+    return g_session
+
+
+async def close_session():
+    """共有セッションを閉じる（ボットの終了時に呼ばれる）"""
+    global g_session
+    if g_session is not None and not g_session.closed:
+        await g_session.close()
+        print("[HttpClient] 共有HTTPセッションを閉じました。")
+    g_session = None
+
+
+def looks_like_audio(head: bytes) -> bool:
+    """ファイルの先頭のバイト列（マジックバイト）が、対応している音声形式のものか"""
+    if head.startswith((b'ID3', b'OggS', b'fLaC', b'#!AMR', b'\x1aE\xdf\xa3')):
+        return True
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:  # MPEG / AAC (ADTS) のフレーム
+        return True
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return True
+    return head[4:8] == b'ftyp'  # MP4 / M4A
+
+
+def _is_audio_content_type(content_type: str) -> bool:
+    """Content-Type が音声（または種類不明のバイナリ）か。Google ドライブの確認画面（text/html）などは False"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return not content_type or content_type.startswith('audio/') or content_type in AUDIO_GENERIC_CONTENT_TYPES
+
+
+def _reject(reason: str, message: str):
+    g_stats['too_large' if reason == 'too_large' else 'rejected'] += 1
+    metrics.MEDIA_DOWNLOADS_REJECTED.inc(reason)
+    print(f"[HttpClient] {message}")
+    return None
+
+
+async def fetch_to_file(url: str, path: str, max_bytes: int = HTTP_MAX_DOWNLOAD_BYTES):
+    """
+    音声ファイルをダウンロードして path に書き込む（全体をメモリに載せない）
+    (v2.0: fetch_bytes から置き換え。HTTP_SPOOL_BYTES ずつ別スレッドでファイルに書き出す)
+    - Content-Type が音声でない場合・先頭のバイト列が音声形式でない場合・max_bytes を超える場合は、途中で打ち切る
+    - 失敗した場合は、書きかけのファイルを削除する
+    戻り値: 書き込んだバイト数（失敗時は None）
+    """
+    session = get_session()
+    g_stats['requests'] += 1
+    async with session.get(url) as response:
+        if response.status != 200:
+            return _reject('status', f"ダウンロードに失敗: HTTP {response.status} ({url})")
+        if not _is_audio_content_type(response.headers.get('Content-Type')):
+            return _reject('content_type', f"音声ではないため中断しました: {response.headers.get('Content-Type')} ({url})")
+        if response.content_length is not None and response.content_length > max_bytes:
+            return _reject('too_large', f"ファイルが大きすぎます: {response.content_length} bytes ({url})")
+
+        buffer = bytearray()
+        written = 0
+        checked = False
+        completed = False
+        f = open(path, 'wb')
+        try:
+            async for chunk in response.content.iter_chunked(HTTP_CHUNK_SIZE):
+                buffer.extend(chunk)
+                if written + len(buffer) > max_bytes:
+                    return _reject('too_large', f"ファイルが大きすぎるため中断しました: {max_bytes} bytes 超 ({url})")
+                if not checked and len(buffer) >= MAGIC_BYTES_LENGTH:
+                    if not looks_like_audio(bytes(buffer[:MAGIC_BYTES_LENGTH])):
+                        return _reject('magic', f"音声形式のファイルではないため中断しました ({url})")
+                    checked = True
+                if len(buffer) >= HTTP_SPOOL_BYTES:
+                    await asyncio.to_thread(f.write, buffer)
+                    written += len(buffer)
+                    buffer.clear()
+            if not checked and not looks_like_audio(bytes(buffer)):
+                return _reject('magic', f"音声形式のファイルではないため中断しました ({url})")
+            if buffer:
+                await asyncio.to_thread(f.write, buffer)
+                written += len(buffer)
+            completed = True
+            return written
+        finally:
+            f.close()
+            if not completed:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def get_stats() -> dict:
+    """リクエスト数・接続の新規作成/再利用の回数を返す"""
+    return dict(g_stats)
@@ -0,0 +1,181 @@
+# 音声などのメディアファイル用ディスクキャッシュ
+# (v1.0: 正規化URLをキーにしたコンテンツアドレス型キャッシュ + LRU削除 + 同時ダウンロードの集約)
+
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+
+from utils import metrics
+
+# --- 定数 ---
+MEDIA_CACHE_DIR = os.getenv('MEDIA_CACHE_DIR', '.media_cache')
+MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', 200 * 1024 * 1024))  # 200MB
+
+
+class MediaCache:
+    """
+    正規化済みURL（QuizData._convert_gdrive_url 適用後）をキーにしたディスクキャッシュ
+    - 容量（バイト数）の上限を超えたら、最も使われていないファイルから削除（LRU）
+    - 同じURLの同時ダウンロードは1回にまとめる（single-flight）
+    """
+
+    def __init__(self, cache_dir: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> ファイルサイズ（先頭ほど古い）
+        self._total_bytes = 0
+        self._inflight = {}  # key -> asyncio.Future（ダウンロード中のもの）
+        self._index_loaded = False
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'coalesced': 0,  # 他のセッションのダウンロード完了を待った回数
+            'evictions': 0,
+            'bytes_served': 0,  # キャッシュから返したバイト数
+            'bytes_downloaded': 0,
+        }
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        """URLからキャッシュキー（ファイル名）を作成する"""
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _load_index(self):
+        """起動後の初回アクセス時に、ディスク上の既存キャッシュを読み込む"""
+        if self._index_loaded:
+            return
+        self._index_loaded = True
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        found = []
+        for name in os.listdir(self.cache_dir):
+            path = self._path(name)
+            # 書き込み途中で残った一時ファイルは削除
+            if '.tmp' in name:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found.append((st.st_mtime, name, st.st_size))
+
+        # 最終利用時刻（mtime）が古い順に並べる
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._evict()
+
+        if found:
+            print(f"[MediaCache] 既存のキャッシュ {len(self._entries)} 件 ({self._total_bytes} bytes) を読み込みました。")
+
+    def _evict(self, keep: str = None):
+        """容量の上限を超えている間、古いものから削除する"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = next(iter(self._entries.items()))
+            if key == keep:
+                # 追加したばかりのファイル自体が上限より大きい場合は残す（次回の追加時に削除）
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(key)
+                continue
+            self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.stats['evictions'] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _lookup(self, key: str):
+        """キャッシュにあればパスを返す（LRUの順番も更新）"""
+        if key not in self._entries:
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)  # 再起動後もLRUの順番を保つため
+        except OSError:
+            # 外部から削除されていた場合
+            self._total_bytes -= self._entries.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return path
+
+    async def get_or_fetch(self, url: str, fetch):
+        """
+        キャッシュ済みファイルのパスを返す。なければ fetch(url, path) でダウンロードして保存する
+        fetch: async def fetch(url, path) -> int | None（path に書き込み、書き込んだバイト数を返す。失敗時は None）
+        (v1.1: ファイルに直接書き込ませ、ダウンロードした内容をメモリに丸ごと載せない)
+        戻り値: キャッシュファイルのパス（失敗時は None）
+        """
+        self._load_index()
+        key = self.make_key(url)
+
+        path = self._lookup(key)
+        if path:
+            self.stats['hits'] += 1
+            self.stats['bytes_served'] += self._entries[key]
+            return path
+
+        # 同じURLをダウンロード中なら、その完了を待つ
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['misses'] += 1
+            # 呼び出し元がキャンセルされても（先読みの中止など）、
+            # 同じファイルを待っている他のセッションに影響しないよう別タスクで実行する
+            inflight = asyncio.ensure_future(self._fetch_and_store(key, url, fetch))
+            self._inflight[key] = inflight
+        return await asyncio.shield(inflight)
+
+    async def _fetch_and_store(self, key: str, url: str, fetch):
+        """
+        ダウンロードしてディスクに保存し、パスを返す（失敗時は None）
+        一時ファイルに書き込んでからリネームする（書き込み途中のファイルを読ませない）
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        try:
+            size = await fetch(url, tmp_path)
+            if size is None:
+                return None
+            os.replace(tmp_path, path)
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self.stats['bytes_downloaded'] += size
+            metrics.AUDIO_DOWNLOAD_BYTES.observe(size)
+            self._evict(keep=key)
+            return path
+        except Exception as e:
+            print(f"[MediaCache] ERROR: '{url}' の保存に失敗しました: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+        finally:
+            self._inflight.pop(key, None)
+
+    def get_stats(self) -> dict:
+        """ヒット数・ミス数・バイト数などの統計を返す"""
+        stats = dict(self.stats)
+        stats['entries'] = len(self._entries)
+        stats['total_bytes'] = self._total_bytes
+        stats['max_bytes'] = self.max_bytes
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
+
+
+# ボット全体で共有するキャッシュ
+g_media_cache = MediaCache()
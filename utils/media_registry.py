@@ -0,0 +1,117 @@
+# Discord にアップロード済みの音声ファイルの登録簿
+# (v1.0: 同じ音声を毎回 discord.File で添付し直さず、最初にアップロードした添付ファイルの CDN URL を使い回す)
+#
+# - キーは変換済みの音声URL（QuizData.audio_fetch_url。media_cache のキーと同じ）
+# - 最初のアップロードで返されたメッセージの添付ファイル（attachments[0]）の URL とサイズを記録する
+# - 以降のセッションでは、その URL をメッセージの本文に入れて送る（Discord が音声プレイヤーとして表示する）
+#   この場合は音声のダウンロード・アップロードのどちらも行わない
+# - Discord の CDN URL は署名付きで、クエリの ex=（16進数の UNIX時間）に有効期限がある
+#   期限の MEDIA_REGISTRY_REFRESH_MARGIN 秒前を過ぎたら使わず、次のアップロードで記録し直す
+#   (ex= がない URL は MEDIA_REGISTRY_DEFAULT_TTL 秒で期限切れとする)
+
+import os
+import time
+from collections import namedtuple
+from urllib.parse import parse_qs, urlsplit
+
+from utils import metrics
+
+# --- 定数 ---
+MEDIA_REGISTRY_ENABLED = os.getenv('MEDIA_REGISTRY', '1') != '0'
+MEDIA_REGISTRY_REFRESH_MARGIN = int(os.getenv('MEDIA_REGISTRY_REFRESH_MARGIN', 3600))  # 1時間
+MEDIA_REGISTRY_DEFAULT_TTL = int(os.getenv('MEDIA_REGISTRY_DEFAULT_TTL', 12 * 3600))  # 12時間
+MEDIA_REGISTRY_MAX_ENTRIES = int(os.getenv('MEDIA_REGISTRY_MAX_ENTRIES', 5000))
+
+# 使い回す添付ファイル（QuizView._prepare_question が discord.File の代わりに返す）
+UploadedMedia = namedtuple('UploadedMedia', ('source_url', 'cdn_url', 'size'))
+
+
+def parse_cdn_expiry(cdn_url: str):
+    """Discord の CDN URL の ex=（16進数の UNIX時間）を返す（ない・読めない場合は None）"""
+    try:
+        values = parse_qs(urlsplit(cdn_url).query).get('ex')
+        return int(values[0], 16) if values else None
+    except ValueError:
+        return None
+
+
+class MediaRegistry:
+    """
+    アップロード済みの音声ファイルの登録簿
+    使い方: media = g_media_registry.lookup(source_url) → あれば media.cdn_url を本文に入れて送り、mark_reused(media)
+            なければ discord.File で添付して送り、record_upload(source_url, message)
+    """
+    def __init__(self, refresh_margin: int = MEDIA_REGISTRY_REFRESH_MARGIN, default_ttl: int = MEDIA_REGISTRY_DEFAULT_TTL,
+                 max_entries: int = MEDIA_REGISTRY_MAX_ENTRIES):
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries = {}  # source_url -> (UploadedMedia, 期限のUNIX時間)。辞書の順番 = 記録した順
+        self.stats = {
+            'uploads': 0,  # 添付ファイルとしてアップロードした回数
+            'reused': 0,  # CDN URL を使い回した回数
+            'expired': 0,  # 期限が近いため記録を捨てた回数
+            'bytes_uploaded': 0,
+            'bytes_avoided': 0,  # 使い回したことで送らずに済んだバイト数
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, source_url: str):
+        """使い回せる添付ファイルを返す（ない・期限が近い場合は None）"""
+        if not MEDIA_REGISTRY_ENABLED or not source_url:
+            return None
+        entry = self._entries.get(source_url)
+        if entry is None:
+            return None
+        media, expires_at = entry
+        if time.time() >= expires_at - self.refresh_margin:
+            del self._entries[source_url]
+            self.stats['expired'] += 1
+            return None
+        return media
+
+    def mark_reused(self, media: UploadedMedia):
+        """CDN URL を使い回して送信したときに呼ぶ（送らずに済んだバイト数を数える）"""
+        self.stats['reused'] += 1
+        self.stats['bytes_avoided'] += media.size
+        metrics.MEDIA_UPLOAD_BYTES.inc('avoided', amount=media.size)
+
+    def record_upload(self, source_url: str, message):
+        """
+        音声ファイルを添付して送信したメッセージから、添付ファイルの CDN URL とサイズを記録する
+        (添付ファイルがない・URLが取れない場合は数えるだけ)
+        """
+        attachments = getattr(message, 'attachments', None) or []
+        if not attachments:
+            return
+        attachment = attachments[0]
+        size = getattr(attachment, 'size', 0) or 0
+        self.stats['uploads'] += 1
+        self.stats['bytes_uploaded'] += size
+        metrics.MEDIA_UPLOAD_BYTES.inc('uploaded', amount=size)
+        cdn_url = getattr(attachment, 'url', None)
+        if not MEDIA_REGISTRY_ENABLED or not source_url or not cdn_url:
+            return
+        expires_at = parse_cdn_expiry(cdn_url) or time.time() + self.default_ttl
+        self._entries.pop(source_url, None)
+        self._entries[source_url] = (UploadedMedia(source_url, cdn_url, size), expires_at)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, source_url: str):
+        """記録を捨てる（次回はアップロードし直す）"""
+        self._entries.pop(source_url, None)
+
+    def get_stats(self) -> dict:
+        """アップロード数・使い回した数・送らずに済んだバイト数などの統計を返す"""
+        stats = dict(self.stats)
+        stats['entries'] = len(self._entries)
+        sends = stats['uploads'] + stats['reused']
+        stats['reuse_ratio'] = stats['reused'] / sends if sends else 0.0
+        return stats
+
+
+# ボット全体で共有する登録簿
+g_media_registry = MediaRegistry()
@@ -0,0 +1,177 @@
+# Prometheus 形式のメトリクス（カウンター・ヒストグラム・ゲージ）
+# (v1.0: Web サーバーの /metrics で公開する。外部ライブラリなしの最小実装)
+#
+# - 記録はイベントループ・sheets_loader のスレッドから、読み出しは Web サーバーのスレッドから行われるため、
+#   メトリクスごとにロックで守る（記録1回あたり辞書の更新数回で、本番でも有効のままにできる）
+# - ラベルは位置引数で渡す（例: SHEETS_CACHE_LOOKUPS.inc('quiz_1', 'hit')）
+# - ラベルの値はシート名・コマンド名など、種類が限られるものだけにすること
+
+import bisect
+import os
+import threading
+
+# --- 定数 ---
+METRICS_ENABLED = os.getenv('METRICS', '1') != '0'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 秒単位のヒストグラムの既定のバケット（Discord の操作・API呼び出しは 10ms 〜 数秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# バイト数のヒストグラムのバケット（音声ファイル: 16KB 〜 8MB）
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 2 * 1024 * 1024, 4 * 1024 * 1024, 8 * 1024 * 1024)
+
+g_registry = []  # 登録済みのメトリクス（/metrics での出力順）
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        g_registry.append(self)
+
+    def _header(self) -> list:
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """増えるだけの値（回数・合計バイト数など）"""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}  # ラベルの値のタプル -> 値
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = self._header()
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """値の分布（処理時間・サイズなど）。バケットごとの件数と合計を持つ"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # ラベルの値のタプル -> [バケットごとの件数（累積ではない）..., 合計, 件数]
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 3)
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = self._header()
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(float(state[-2]))}')
+            lines.append(f'{self.name}_count{label_text} {state[-1]}')
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    /metrics の出力時に関数を呼んで値を得るメトリクス（実行中のセッション数・既存の統計など）
+    func は数値、またはラベルの値のタプル -> 数値 の辞書を返す
+    """
+    def __init__(self, name: str, help_text: str, func, kind='gauge', labelnames=()):
+        self.kind = kind
+        self.func = func
+        super().__init__(name, help_text, labelnames)
+
+    def render(self) -> list:
+        lines = self._header()
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"[Metrics] WARNING: {self.name} の値を取得できません: {e}")
+            return lines
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for labels, item_value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(item_value)}')
+        return lines
+
+
+def render() -> str:
+    """登録済みのすべてのメトリクスを Prometheus のテキスト形式で返す"""
+    lines = []
+    for metric in g_registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# 🔽 --- ボットのメトリクス --- 🔽
+SHEETS_CACHE_LOOKUPS = Counter(
+    'quizbot_sheets_cache_lookups_total', 'Sheet cache lookups by result (hit, stale, miss).', ('sheet', 'result'))
+SHEETS_FETCH_SECONDS = Histogram(
+    'quizbot_sheets_fetch_seconds', 'Latency of Sheets API fetches.', ('backend',))
+SHEETS_FETCH_ERRORS = Counter(
+    'quizbot_sheets_fetch_errors_total', 'Failed Sheets API fetches.', ('backend',))
+
+AUDIO_DOWNLOAD_SECONDS = Histogram(
+    'quizbot_audio_download_seconds', 'Time to get an audio file ready, including cache hits (result: ok, failed).', ('result',))
+AUDIO_DOWNLOAD_BYTES = Histogram(
+    'quizbot_audio_download_bytes', 'Size of audio files downloaded from the origin.', buckets=BYTES_BUCKETS)
+MEDIA_DOWNLOADS_REJECTED = Counter(
+    'quizbot_media_downloads_rejected_total', 'Audio downloads aborted (status, content_type, magic, too_large).', ('reason',))
+MEDIA_UPLOAD_BYTES = Counter(
+    'quizbot_media_upload_bytes_total', 'Audio bytes attached to Discord messages (uploaded) or skipped by reusing a CDN URL (avoided).', ('result',))
+
+COMMAND_FIRST_QUESTION_SECONDS = Histogram(
+    'quizbot_command_first_question_seconds', 'Time from a slash command to its first question being shown.', ('type',))
+CLICK_REVEAL_SECONDS = Histogram(
+    'quizbot_click_reveal_seconds', 'Time from an answer click to the answer being shown.', ('type',))
+NEXT_QUESTION_SECONDS = Histogram(
+    'quizbot_next_question_seconds', 'Time to show the next question after the answer pause.', ('type',))
+
+DISCORD_REST_SECONDS = Histogram(
+    'quizbot_discord_rest_seconds', 'Latency of Discord REST calls made through the scheduler.', ('priority',))
+DISCORD_REST_QUEUE_SECONDS = Histogram(
+    'quizbot_discord_rest_queue_seconds', 'Time Discord REST calls waited in the scheduler queue.', ('priority',))
+DISCORD_REST_ERRORS = Counter(
+    'quizbot_discord_rest_errors_total', 'Discord REST calls that raised, by exception type.', ('priority', 'error'))
+DISCORD_RATE_LIMITS = Counter(
+    'quizbot_discord_rate_limits_total', '429 responses discord.py waited on (scope: bucket or global).', ('scope',))
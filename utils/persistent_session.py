@@ -0,0 +1,141 @@
+# 再起動後も続けられるセッション（永続セッション）
+# (v1.0: セッションの状態をボタンの custom_id に保存し、View オブジェクトを保持しない)
+#
+# custom_id の形式（Discord の上限は100文字）:
+#   クイズ: qz1:<コマンド名>:<シード>:<デッキの署名>:<問題番号>:<正解のビット列>:<表示した時刻>:<選択肢>
+#   診断:   dg1:<コマンド名>:<デッキの署名>:<質問番号>:<回答のビット列>:<表示した時刻>:<選択肢>
+# 数値はすべて36進数。コマンド名に ':' は使えないため、区切り文字として使える
+# 問題の順番はシードから再現し、正解数・診断のスコアはビット列から計算し直す
+
+import os
+import random
+import time
+import zlib
+
+# --- 定数 ---
+PERSISTENT_SESSIONS = os.getenv('PERSISTENT_SESSIONS', '0') != '0'
+SESSION_TIMEOUT = 300  # 最後に表示してからこの秒数が過ぎたボタンは時間切れ（通常の View と同じ5分）
+CUSTOM_ID_MAX_LENGTH = 100
+QUIZ_PREFIX = 'qz1'
+DIAGNOSIS_PREFIX = 'dg1'
+
+
+def _b36(number: int) -> str:
+    """0以上の整数を36進数の文字列にする"""
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    if number == 0:
+        return '0'
+    chars = []
+    while number:
+        number, rem = divmod(number, 36)
+        chars.append(digits[rem])
+    return ''.join(reversed(chars))
+
+
+def deck_signature(texts) -> str:
+    """デッキの内容の署名（シートが更新されて問題が変わった場合に、古いボタンを無効にするため）"""
+    crc = 0
+    for text in texts:
+        crc = zlib.crc32(str(text).encode('utf-8'), crc)
+    return _b36(crc)
+
+
+class QuizSession:
+    """クイズの永続セッションの状態（custom_id 1つ分）"""
+    __slots__ = ('command_name', 'seed', 'signature', 'index', 'correct_bits', 'updated_at', 'choice')
+
+    def __init__(self, command_name, seed, signature, index=0, correct_bits=0, updated_at=0, choice=0):
+        self.command_name = command_name
+        self.seed = seed
+        self.signature = signature
+        self.index = index  # 現在の問題番号（0始まり）
+        self.correct_bits = correct_bits  # i ビット目 = i 問目に正解したか
+        self.updated_at = updated_at
+        self.choice = choice  # 押されたボタンの選択肢（1始まり）
+
+    @classmethod
+    def new(cls, command_name: str, deck) -> 'QuizSession':
+        return cls(command_name, random.getrandbits(32), quiz_deck_signature(deck))
+
+    def order(self, count: int) -> list:
+        """シートの問題の番号を、このセッションの出題順に並べたもの"""
+        return random.Random(self.seed).sample(range(count), k=count)
+
+    def custom_id(self, index: int, correct_bits: int, choice: int) -> str:
+        return ':'.join((
+            QUIZ_PREFIX, self.command_name, _b36(self.seed), self.signature,
+            _b36(index), _b36(correct_bits), _b36(int(time.time())), str(choice)
+        ))
+
+    def fits(self, question_count: int, option_count: int = 9) -> bool:
+        """全問正解・最終問題でも custom_id が上限に収まるか（収まらないデッキは通常の View を使う）"""
+        longest = self.custom_id(question_count, (1 << question_count) - 1, option_count)
+        return len(longest) <= CUSTOM_ID_MAX_LENGTH
+
+    def is_expired(self) -> bool:
+        return time.time() - self.updated_at > SESSION_TIMEOUT
+
+
+class DiagnosisSession:
+    """診断の永続セッションの状態（custom_id 1つ分）"""
+    __slots__ = ('command_name', 'signature', 'index', 'choice_bits', 'updated_at', 'choice')
+
+    def __init__(self, command_name, signature, index=0, choice_bits=0, updated_at=0, choice=0):
+        self.command_name = command_name
+        self.signature = signature
+        self.index = index  # 現在の質問番号（0始まり）
+        self.choice_bits = choice_bits  # i ビット目 = i 問目で選択肢2を選んだか
+        self.updated_at = updated_at
+        self.choice = choice  # 押されたボタンの選択肢（1 or 2）
+
+    @classmethod
+    def new(cls, command_name: str, deck) -> 'DiagnosisSession':
+        return cls(command_name, diagnosis_deck_signature(deck))
+
+    def custom_id(self, index: int, choice_bits: int, choice: int) -> str:
+        return ':'.join((
+            DIAGNOSIS_PREFIX, self.command_name, self.signature,
+            _b36(index), _b36(choice_bits), _b36(int(time.time())), str(choice)
+        ))
+
+    def fits(self, question_count: int) -> bool:
+        longest = self.custom_id(question_count, (1 << question_count) - 1, 2)
+        return len(longest) <= CUSTOM_ID_MAX_LENGTH
+
+    def is_expired(self) -> bool:
+        return time.time() - self.updated_at > SESSION_TIMEOUT
+
+
+def quiz_deck_signature(deck) -> str:
+    return deck_signature(q.question_text for q in deck)
+
+
+def diagnosis_deck_signature(deck) -> str:
+    texts = [q.question_text for q in deck.questions] + [r.type_code for r in deck.results]
+    return deck_signature(texts)
+
+
+def parse_custom_id(custom_id: str):
+    """
+    永続セッションのボタンの custom_id を解析する
+    戻り値: QuizSession / DiagnosisSession（永続セッションのものでない・壊れている場合は None）
+    """
+    if not custom_id.startswith((QUIZ_PREFIX + ':', DIAGNOSIS_PREFIX + ':')):
+        return None
+    parts = custom_id.split(':')
+    try:
+        if parts[0] == QUIZ_PREFIX and len(parts) == 8:
+            _, command_name, seed, signature, index, correct_bits, updated_at, choice = parts
+            return QuizSession(
+                command_name, int(seed, 36), signature,
+                int(index, 36), int(correct_bits, 36), int(updated_at, 36), int(choice)
+            )
+        if parts[0] == DIAGNOSIS_PREFIX and len(parts) == 7:
+            _, command_name, signature, index, choice_bits, updated_at, choice = parts
+            return DiagnosisSession(
+                command_name, signature, int(index, 36), int(choice_bits, 36), int(updated_at, 36), int(choice)
+            )
+    except ValueError:
+        pass
+    print(f"[PersistentSession] WARNING: 解析できない custom_id です: {custom_id}")
+    return None
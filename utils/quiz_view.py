@@ -4,27 +4,60 @@
 import discord
 import random
 import asyncio
-import aiohttp  # 非同期HTTPリクエスト用
-import io  # BytesIO用 
+import functools
+import os
+import time
+
+from utils import http_client  # 共有HTTPクライアント（接続を使い回す）
+from utils.media_cache import g_media_cache  # 音声ファイルのディスクキャッシュ
+from utils.media_registry import g_media_registry, UploadedMedia  # アップロード済みの音声ファイルの登録簿
+from utils.rest_scheduler import g_rest_scheduler, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from utils.persistent_session import QuizSession
+from utils.session_registry import g_session_registry  # 実行中のセッションの登録簿
+from utils import metrics  # /metrics 用のヒストグラム・カウンター
 
 # 🔽 --- スプレッドシートのデータを扱うためのクラス (v2.8: Discord内で音声・画像を直接表示) --- 🔽
 # QuizData クラスの __init__ メソッド修正版
 # quiz_view.py の QuizData クラス全体をこれに置き換えてください
 
+# 選択肢のラベル（画像がある問題のボタン・画像のみの選択肢名に使用）
+OPTION_LABELS = ("A", "B", "C", "D", "E", "F", "G", "H", "I")
+# 画像のない問題で共有する option_images（選択肢の数ごと）
+_NO_IMAGES = tuple((None,) * n for n in range(len(OPTION_LABELS) + 1))
+# 画像のある問題で共有するボタンのラベル（選択肢の数ごと）
+_IMAGE_LABELS = tuple(OPTION_LABELS[:n] for n in range(len(OPTION_LABELS) + 1))
+# 表示用のテンプレート（画像の Embed・答え合わせの Embed）を保持する問題数 (v3.10)
+EMBED_TEMPLATE_CACHE_SIZE = int(os.getenv('EMBED_TEMPLATE_CACHE_SIZE', 1024))
+# 答え合わせの Embed のタイトルと色（不正解, 正解）
+_REVEAL_STYLES = (("❌ 不正解...", discord.Color.red()), ("⭕ 正解！", discord.Color.green()))
+
 class QuizData:
     """
     スプレッドシートの1行（1問）のデータを格納するクラス
     bot.py がこのクラスのリストを作成して QuizView に渡します
     (v3.2: 画像のみの選択肢に対応)
+    (v3.6: __slots__ + タプルの変更不可なデータに変更。表示に使う値は読み込み時に1回だけ計算する)
     """
+    __slots__ = (
+        'question_id', 'question_text', 'options',
+        'option_images',  # 選択肢ごとの画像URL（埋め込み用に変換済み、なければ None）
+        'audio_url', 'correct_answer', 'explanation',
+        # 🔽 読み込み時に計算しておく値
+        'correct_index',  # 正解の選択肢（0始まり）
+        'has_images',  # 画像付きの選択肢があるか
+        'button_labels',  # ボタンのラベル（画像がある場合は A/B/C...）
+        'audio_fetch_url',  # 変換済みの音声URL（なければ None）
+    )
+
     def __init__(self, record: dict):
         # record は {'text': '問題文', 'option_1': '選択肢1', ...} のような辞書
-        self.question_id = record.get('question_id', 'N/A')
-        self.question_text = record.get('text')  # スプレッドシートのカラム名は 'text'
+        set_ = object.__setattr__  # __setattr__ で変更を禁止しているため
+        question_id = record.get('question_id', 'N/A')
+        question_text = record.get('text')  # スプレッドシートのカラム名は 'text'
         
         # 🔽 修正: 選択肢とその画像を同時に収集
-        self.options = []
-        self.option_images = []
+        options = []
+        option_images = []
         
         for i in range(1, 10):  # option_9 まで自動で探す
             opt_text = record.get(f'option_{i}')
@@ -37,42 +70,61 @@ class QuizData:
             if has_text or has_image:
                 # テキストが空の場合はデフォルトのラベルを設定
                 if has_text:
-                    self.options.append(str(opt_text))
+                    options.append(str(opt_text))
                 else:
-                    # 画像のみの場合、ラベルマップに対応した文字を使用
-                    label_map = {1: "A", 2: "B", 3: "C", 4: "D", 5: "E", 6: "F", 7: "G", 8: "H", 9: "I"}
-                    self.options.append(f"選択肢{label_map.get(i, str(i))}")
+                    # 画像のみの場合、ラベルに対応した文字を使用
+                    options.append(f"選択肢{OPTION_LABELS[i - 1]}")
                 
-                # 画像URLを追加（なければNone）
-                if has_image:
-                    self.option_images.append(str(opt_image).strip())
-                else:
-                    self.option_images.append(None)
+                # 画像URLを埋め込み可能な形式に変換して追加（なければNone）
+                option_images.append(QuizData._convert_gdrive_url(str(opt_image).strip()) if has_image else None)
             else:
                 # テキストも画像もない場合は終了
                 break
         
         # 🔽 新規追加: 音声URL
-        self.audio_url = record.get('audio_url')
-        if self.audio_url and str(self.audio_url).strip() != "":
-            self.audio_url = str(self.audio_url).strip()
+        audio_url = record.get('audio_url')
+        if audio_url and str(audio_url).strip() != "":
+            audio_url = str(audio_url).strip()
         else:
-            self.audio_url = None
+            audio_url = None
         
-        self.correct_answer = str(record.get('correct_answer'))
-        self.explanation = record.get('explanation')
+        correct_answer = str(record.get('correct_answer'))
+        explanation = record.get('explanation')
         
         # バリデーション（データが揃っているか確認）
-        if not all([self.question_text, self.options, self.correct_answer, self.explanation]):
-            raise ValueError(f"クイズデータに不足があります (ID: {self.question_id}): {record}")
+        if not all([question_text, options, correct_answer, explanation]):
+            raise ValueError(f"クイズデータに不足があります (ID: {question_id}): {record}")
         
         # 正解番号（correct_answer）が選択肢の範囲内かチェック
         try:
-            correct_index = int(self.correct_answer) - 1  # 1始まりを0始まりに
-            if not (0 <= correct_index < len(self.options)):
-                raise ValueError(f"正解番号 '{self.correct_answer}' が選択肢の範囲外です (ID: {self.question_id})")
+            correct_index = int(correct_answer) - 1  # 1始まりを0始まりに
         except ValueError:
-            raise ValueError(f"正解番号 '{self.correct_answer}' が数字ではありません (ID: {self.question_id})")
+            raise ValueError(f"正解番号 '{correct_answer}' が数字ではありません (ID: {question_id})")
+        if not (0 <= correct_index < len(options)):
+            raise ValueError(f"正解番号 '{correct_answer}' が選択肢の範囲外です (ID: {question_id})")
+        
+        has_images = any(option_images)
+        
+        set_(self, 'question_id', question_id)
+        set_(self, 'question_text', question_text)
+        options = tuple(options)
+        set_(self, 'options', options)
+        set_(self, 'option_images', tuple(option_images) if has_images else _NO_IMAGES[len(options)])
+        set_(self, 'audio_url', audio_url)
+        set_(self, 'correct_answer', correct_answer)
+        set_(self, 'explanation', explanation)
+        set_(self, 'correct_index', correct_index)
+        set_(self, 'has_images', has_images)
+        # 画像がない場合はテキストをそのままラベルにするため、options と同じタプルを共有する
+        set_(self, 'button_labels', _IMAGE_LABELS[len(options)] if has_images else options)
+        set_(self, 'audio_fetch_url', QuizData._convert_gdrive_url(audio_url) if audio_url else None)
+
+    def __setattr__(self, name, value):
+        # デッキは全セッションで共有されるため、読み込み後の変更を禁止する
+        raise AttributeError(f"QuizData は変更できません ({name})")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"QuizData は変更できません ({name})")
     
     @staticmethod
     def _convert_gdrive_url(url: str) -> str:
@@ -96,13 +148,80 @@ class QuizData:
         
         return url
 
+# 🔽 表示用のテンプレート (v3.10: QuizData には持たせず、表示した問題の分だけ作って共有する)
+# 全ユーザー・全セッションで共有するため、変更しないこと
+# (v3.8 では全問題の分を読み込み時に作っていたが、デッキのメモリが数倍になるため、使われた問題だけを LRU で保持する)
+# (LRU のキーは QuizData のため、デッキを作り直すときは clear_embed_templates で捨てる。古いデッキを残さないため)
+def get_image_embeds(question: QuizData) -> tuple:
+    """選択肢の画像の Embed のタプルを返す（画像がない問題は空のタプル）"""
+    return _build_image_embeds(question) if question.has_images else ()
+
+@functools.lru_cache(maxsize=EMBED_TEMPLATE_CACHE_SIZE)
+def _build_image_embeds(question: QuizData) -> tuple:
+    """
+    画像がある選択肢ごとの Embed を作成する
+    (v2.8: Discord内で画像を直接表示)
+    """
+    image_embeds = []
+    for i, (option_text, img_url) in enumerate(zip(question.options, question.option_images)):
+        if img_url:
+            embed = discord.Embed(color=discord.Color.blue())
+            embed.set_author(name=f"選択肢 {OPTION_LABELS[i]}: {option_text}")
+            embed.set_image(url=img_url)
+            image_embeds.append(embed)
+    return tuple(image_embeds)
+
+@functools.lru_cache(maxsize=EMBED_TEMPLATE_CACHE_SIZE)
+def get_reveal_embeds(question: QuizData) -> tuple:
+    """答え合わせの Embed を作成する。戻り値: (不正解の Embed, 正解の Embed)"""
+    # 🔽 画像のみの場合は「選択肢X」と表示
+    if question.has_images:
+        correct_value = f"選択肢 {OPTION_LABELS[question.correct_index]}"
+    else:
+        correct_value = f"{question.options[question.correct_index]}"
+    # 2つの Embed で説明文・色の文字列やオブジェクトを共有し、デッキのメモリを抑える
+    description = f"**解説:**\n{question.explanation}"
+    embeds = []
+    for title, color in _REVEAL_STYLES:
+        embed = discord.Embed(title=title, description=description, color=color)
+        embed.add_field(name="正解", value=correct_value)
+        embeds.append(embed)
+    return tuple(embeds)
+
+def clear_embed_templates():
+    """表示用のテンプレートをすべて捨てる（次に表示したときに作り直す）"""
+    _build_image_embeds.cache_clear()
+    get_reveal_embeds.cache_clear()
+
+def build_quiz_deck(records: list) -> tuple:
+    """
+    シートの records から QuizData のタプル（デッキ）を作成する
+    sheets_loader.load_parsed_data でキャッシュされ、全セッションで共有される
+    (シートが更新されてデッキを作り直す場合、テンプレートの LRU が古い QuizData を保持し続けないように捨てる)
+    """
+    deck = tuple(QuizData(record) for record in records)
+    clear_embed_templates()
+    return deck
+
 # 🔽 --- QuizView クラスをスプレッドシート対応に修正 (v2.8: Discord内で音声・画像を直接表示) --- 🔽
 class QuizView(discord.ui.View):
     """クイズ用の共通Viewクラス (スプレッドシート連携版 + Discord内で音声・画像を直接表示)"""
 
-    def __init__(self, questions: list[QuizData], bot_title: str):
-        super().__init__(timeout=300.0) # 5分でタイムアウト
-        self.questions = random.sample(questions, k=len(questions)) # 問題をシャッフル
+    # 答え合わせを表示してから次の問題に進むまでの秒数 (v2.1: 2秒)
+    ANSWER_REVEAL_SECONDS = 2.0
+
+    def __init__(self, questions: list[QuizData], bot_title: str, session: QuizSession = None):
+        """
+        session を指定した場合は永続セッション (v3.9):
+        状態はボタンの custom_id に保存し、この View はボタン1回分の処理が終われば捨てる
+        """
+        super().__init__(timeout=None if session else 300.0) # 5分でタイムアウト
+        self.session = session
+        if session:
+            # シードから出題順を再現する
+            self.questions = [questions[i] for i in session.order(len(questions))]
+        else:
+            self.questions = random.sample(questions, k=len(questions)) # 問題をシャッフル
         self.bot_title = bot_title
         
         # View 自身が状態を持つように変更
@@ -110,9 +229,53 @@ class QuizView(discord.ui.View):
         self.correct_count = 0
         self.interaction = None # start() で interaction を保持する
         self.followup_message = None # 🔽 追加: followup メッセージを保持
+        self.followup_token = None  # followup_message を送信したインタラクションのトークン（レート制限のバケット）
         
         # 🔽 復習機能 (v2): 各問題の結果を記録
         self.results_history = []  # 各問題の結果を保存するリスト
+        
+        # 🔽 先読み (v3.5): 次の問題の音声・Embed・ボタンをバックグラウンドで準備する
+        self._prefetch_task = None
+        self._prefetch_index = None
+        # 表示中の質問のメインEmbed（答え合わせの表示で使い回す）
+        self._current_embed = None
+        # 永続セッションで、押されたボタンのメッセージを編集対象にするか
+        self._edit_clicked_message = False
+        
+        if session:
+            self._restore_session(session)
+            # 送信時に View が保持されないよう、最初から終了済みにしておく（ボタンは on_interaction で処理）
+            super().stop()
+
+    def _restore_session(self, session: QuizSession):
+        """custom_id の状態（問題番号・正解のビット列）から、正解数と復習用の記録を作り直す"""
+        self.current_question_index = session.index
+        for i in range(min(session.index, len(self.questions))):
+            question = self.questions[i]
+            is_correct = bool(session.correct_bits >> i & 1)
+            self.correct_count += is_correct
+            self.results_history.append({
+                'question_number': i + 1,
+                'question_text': question.question_text,
+                'is_correct': is_correct,
+                'result_icon': "⭕" if is_correct else "❌",
+                'correct_text': question.options[question.correct_index],
+                'explanation': question.explanation
+            })
+
+    async def resume(self, interaction: discord.Interaction, command_id='0'):
+        """永続セッションのボタンが押されたときの処理（bot.py の on_interaction から呼ばれる）"""
+        self.command_name = self.session.command_name
+        self.command_id = command_id
+        self._edit_clicked_message = True
+        await self.button_callback(interaction)
+
+    def _answer_custom_id(self, choice: int) -> str:
+        """選択肢ボタンの custom_id（永続セッションの場合は状態を含める）"""
+        if self.session is None:
+            return f"answer_{choice}"
+        correct_bits = sum(1 << i for i, result in enumerate(self.results_history) if result['is_correct'])
+        return self.session.custom_id(self.current_question_index, correct_bits, choice)
 
     async def start(self, interaction: discord.Interaction):
         """
@@ -139,26 +302,27 @@ class QuizView(discord.ui.View):
         """
         音声URLから音声ファイルをダウンロードしてdiscord.Fileオブジェクトを返す
         (v2.9: ephemeralメッセージ内で音声を再生するため)
+        (v3.3: ディスクキャッシュ経由で、同じ音声を何度もダウンロードしない)
+        (v3.4: ボット共有のHTTPクライアントで接続を使い回す)
+        (v3.9: キャッシュのファイルに直接ダウンロードし、音声でないもの・大きすぎるものは途中で打ち切る)
         """
+        started = time.perf_counter()
         try:
-            # Googleドライブ URL を変換
+            # Googleドライブ URL を変換（キャッシュのキーにもなる）
             converted_url = QuizData._convert_gdrive_url(audio_url)
             
-            # 非同期でファイルをダウンロード
-            async with aiohttp.ClientSession() as session:
-                async with session.get(converted_url) as response:
-                    if response.status == 200:
-                        audio_data = await response.read()
-                        # ファイル名をURLから取得（なければデフォルト）
-                        filename = "audio.mp3"
-                        if "/" in audio_url:
-                            filename = audio_url.split("/")[-1].split("?")[0]
-                        
-                        # BytesIOオブジェクトを作成
-                        audio_bytes = io.BytesIO(audio_data)
-                        return discord.File(audio_bytes, filename=filename)
+            cached_path = await g_media_cache.get_or_fetch(converted_url, http_client.fetch_to_file)
+            if cached_path:
+                # ファイル名をURLから取得（なければデフォルト）
+                filename = "audio.mp3"
+                if "/" in audio_url:
+                    filename = audio_url.split("/")[-1].split("?")[0]
+                metrics.AUDIO_DOWNLOAD_SECONDS.observe(time.perf_counter() - started, 'ok')
+                return discord.File(cached_path, filename=filename)
+            metrics.AUDIO_DOWNLOAD_SECONDS.observe(time.perf_counter() - started, 'failed')
             return None
         except Exception as e:
+            metrics.AUDIO_DOWNLOAD_SECONDS.observe(time.perf_counter() - started, 'failed')
             print(f"[QuizView] 音声ファイルのダウンロードに失敗: {e}")
             return None
 
@@ -172,56 +336,125 @@ class QuizView(discord.ui.View):
             description=f"**{question.question_text}**",
             color=discord.Color.blue()
         )
-        embed.set_footer(text=f"全{len(self.questions)}問 | 正解数: {self.correct_count}")
+        self._set_footer(embed)
         return embed
+
+    def _set_footer(self, embed: discord.Embed):
+        """セッションごとの値（全問題数・正解数）をフッターに設定する"""
+        embed.set_footer(text=f"全{len(self.questions)}問 | 正解数: {self.correct_count}")
     
     def create_image_embeds(self, question: QuizData):
         """
-        画像がある場合、各選択肢用のEmbedを作成する
-        (v2.8: Discord内で画像を直接表示)
+        画像がある場合、各選択肢用のEmbedを返す
+        (v3.8: 共有テンプレート。変更しないこと)
         """
-        image_embeds = []
-        has_images = any(img for img in question.option_images)
-        
-        if has_images:
-            label_map = {0: "A", 1: "B", 2: "C", 3: "D", 4: "E", 5: "F", 6: "G", 7: "H", 8: "I"}
-            
-            for i, (option_text, img_url) in enumerate(zip(question.options, question.option_images)):
-                if img_url:
-                    converted_url = QuizData._convert_gdrive_url(img_url)
-                    embed = discord.Embed(color=discord.Color.blue())
-                    embed.set_author(name=f"選択肢 {label_map.get(i, str(i+1))}: {option_text}")
-                    embed.set_image(url=converted_url)
-                    image_embeds.append(embed)
-        
-        return image_embeds
+        return get_image_embeds(question)
 
     def update_buttons(self, question: QuizData):
         """
         質問に合わせてボタン（選択肢）を動的に作成・更新する
         (v2.7: 画像がある場合はA/B/C/Dボタンに変更)
         """
+        self._set_buttons(self._build_buttons(question))
+
+    def _set_buttons(self, buttons: list):
+        """作成済みのボタンで View の中身を入れ替える"""
         self.clear_items() # 既存のボタンをクリア
-        
-        # 🔽 画像があるかどうかを判定
-        has_images = any(img for img in question.option_images)
+        for button in buttons:
+            self.add_item(button)
+
+    def _build_buttons(self, question: QuizData) -> list:
+        """
+        質問の選択肢ボタンを作成する（View にはまだ追加しない）
+        先読みでも使うため、View の状態は変更しない
+        """
+        buttons = []
 
         # 選択肢の数だけボタンを作成
-        for i, option_text in enumerate(question.options):
-            # 画像がある場合はA/B/C/Dラベル、ない場合はテキストラベル
-            if has_images:
-                label_map = {0: "A", 1: "B", 2: "C", 3: "D", 4: "E", 5: "F", 6: "G", 7: "H", 8: "I"}
-                label = label_map.get(i, str(i+1))
-            else:
-                label = option_text
-            
+        # (画像がある場合はA/B/C/Dラベル、ない場合はテキストラベル: 読み込み時に計算済み)
+        for i, label in enumerate(question.button_labels):
             button = discord.ui.Button(
                 label=label,
                 style=discord.ButtonStyle.secondary,
-                custom_id=f"answer_{i+1}" # custom_id に選択肢番号(1始まり)を設定
+                custom_id=self._answer_custom_id(i + 1) # custom_id に選択肢番号(1始まり)を設定
             )
             button.callback = self.button_callback
-            self.add_item(button)
+            buttons.append(button)
+        return buttons
+
+    async def _prepare_question(self, index: int):
+        """
+        指定した問題の画像Embeds・ボタン・音声ファイルを準備する
+        戻り値: (image_embeds, buttons, audio_file)
+        (v3.9: アップロード済みの音声は、ダウンロードせずに UploadedMedia（CDN URL）を返す)
+        """
+        question = self.questions[index]
+        image_embeds = self.create_image_embeds(question)
+        buttons = self._build_buttons(question)
+        audio_file = None
+        if question.audio_url:
+            audio_file = g_media_registry.lookup(question.audio_fetch_url)
+            if audio_file is None:
+                audio_file = await self.download_audio_file(question.audio_url)
+        return image_embeds, buttons, audio_file
+
+    def _start_prefetch(self, index: int):
+        """
+        次の問題の準備をバックグラウンドで開始する
+        (問題の表示中・答え合わせの待機中に音声のダウンロードを済ませておく)
+        """
+        self._cancel_prefetch()
+        if index >= len(self.questions) or self.is_finished():
+            return
+        self._prefetch_index = index
+        self._prefetch_task = asyncio.create_task(self._prepare_question(index))
+
+    async def _get_prepared_question(self, index: int):
+        """先読み済みならその結果を、なければその場で準備した結果を返す"""
+        task = self._prefetch_task
+        if task is not None and self._prefetch_index == index and not task.cancelled():
+            self._prefetch_task = None
+            self._prefetch_index = None
+            return await task
+        return await self._prepare_question(index)
+
+    def _cancel_prefetch(self):
+        """先読みを中止する（タイムアウト時・終了時）"""
+        task = self._prefetch_task
+        self._prefetch_task = None
+        self._prefetch_index = None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            # 使われなかった音声ファイルを閉じる
+            self._close_audio_file(task.result()[2])
+
+    @staticmethod
+    def _close_audio_file(audio_file):
+        """送らなかった音声ファイルを閉じる（UploadedMedia は閉じるものがない）"""
+        if isinstance(audio_file, discord.File):
+            audio_file.close()
+
+    def _is_closed(self) -> bool:
+        """
+        await の間にセッションが終了した（新しいセッションに置き換えられた・タイムアウトした）か
+        (終了後は questions を手放しているため、続きの処理をせずに戻る。永続セッションは View を保持しないため対象外)
+        """
+        return self.session is None and self.is_finished()
+
+    def stop(self):
+        """View を終了する（先読みを中止し、登録簿から外してデッキへの参照を手放す）"""
+        self._cancel_prefetch()
+        g_session_registry.release(self)
+        super().stop()
+        self._release_deck()
+
+    def _release_deck(self):
+        """終了したセッションが、共有のデッキ（QuizData）を保持し続けないようにする"""
+        self.questions = []
+        self._current_embed = None
 
     async def show_question(self):
         """
@@ -236,63 +469,65 @@ class QuizView(discord.ui.View):
         
         # 音声URLがある場合はメッセージcontentに含める
         audio_content = None
-        if question.audio_url:
-            converted_url = QuizData._convert_gdrive_url(question.audio_url)
-            audio_content = f"🎵 **音声を再生:**\n{converted_url}"
+        if question.audio_fetch_url:
+            audio_content = f"🎵 **音声を再生:**\n{question.audio_fetch_url}"
         
         # すべてのEmbedを結合
-        all_embeds = [main_embed] + image_embeds
+        all_embeds = [main_embed, *image_embeds]
+        self._current_embed = main_embed
         
-        await self.interaction.edit_original_response(
-            content=audio_content,
-            embeds=all_embeds,
-            view=self
+        await self._edit_message(PRIORITY_HIGH, content=audio_content, embeds=all_embeds, view=self)
+
+    async def _edit_message(self, priority, **kwargs):
+        """
+        表示中のメッセージ（followup_message、なければ元の応答）を編集する
+        (v3.7: REST スケジューラー経由で、同じメッセージへの編集は順番に1つずつ送る)
+        """
+        if self.followup_message:
+            return await g_rest_scheduler.submit(self.followup_token, priority, self.followup_message.edit, **kwargs)
+        return await g_rest_scheduler.submit(
+            self.interaction.token, priority, self.interaction.edit_original_response, **kwargs
         )
 
+    async def _send_followup_message(self, priority, **kwargs):
+        """ephemeral の followup を送信し、以降の編集対象（followup_message）にする"""
+        self.followup_message = await g_rest_scheduler.submit(
+            self.interaction.token, priority, self.interaction.followup.send, ephemeral=True, wait=True, **kwargs
+        )
+        self.followup_token = self.interaction.token
+        return self.followup_message
+
     async def show_question_with_followup(self):
         """
         現在の質問を表示（followup版）
         (v3.1: 音声の有無で処理を分岐し、「読み込めませんでした」エラーを防ぐ)
+        (v3.5: 先読み済みの音声・Embed・ボタンを使い、表示後に次の問題の先読みを開始)
         """
         question = self.questions[self.current_question_index]
+        
+        # 画像Embeds・ボタン・音声ファイル（先読み済みならダウンロード待ちなし）
+        image_embeds, buttons, audio_file = await self._get_prepared_question(self.current_question_index)
+        if self._is_closed():
+            # ダウンロード中に終了した（新しいセッションに置き換えられた・タイムアウトした）
+            self._close_audio_file(audio_file)
+            return
         main_embed = self.create_embed(question)
-        image_embeds = self.create_image_embeds(question)
-        self.update_buttons(question)
+        self._set_buttons(buttons)
         
         # すべてのEmbedを結合（メインEmbed + 画像Embeds）
-        all_embeds = [main_embed] + image_embeds
-        
-        # 音声ファイルの処理
-        audio_file = None
-        audio_content = None
-        has_audio = False
+        all_embeds = [main_embed, *image_embeds]
+        self._current_embed = main_embed
         
-        # audio_url が存在し、かつ空でない場合のみダウンロードを試みる
-        if question.audio_url:
-            audio_file = await self.download_audio_file(question.audio_url)
-            if audio_file:
-                audio_content = "🎵 **音声を再生:**"
-                has_audio = True
+        # audio_url が存在し、ダウンロードできた（またはアップロード済みの）場合のみ添付する
+        has_audio = bool(audio_file)
         
         # 🔽 重要な修正: 音声の有無で処理を分岐
-        if self.followup_message is None:
+        if self.followup_message is None and not self._edit_clicked_message:
             # 最初の質問: 新しいメッセージを送信
             if has_audio:
-                self.followup_message = await self.interaction.followup.send(
-                    content=audio_content,
-                    file=audio_file,
-                    embeds=all_embeds,
-                    view=self,
-                    ephemeral=True,
-                    wait=True
-                )
+                await self._send_audio_question(question, audio_file, all_embeds)
             else:
-                self.followup_message = await self.interaction.followup.send(
-                    embeds=all_embeds,
-                    view=self,
-                    ephemeral=True,
-                    wait=True
-                )
+                await self._send_followup_message(PRIORITY_HIGH, embeds=all_embeds, view=self)
         else:
             # 2問目以降の処理
             if has_audio:
@@ -302,37 +537,55 @@ class QuizView(discord.ui.View):
                     # 前のメッセージのボタンを無効化（削除はしない）
                     for item in self.children:
                         item.disabled = True
-                    await self.followup_message.edit(view=self)
-                    # ボタンを再度有効化
-                    self.update_buttons(question)
+                    await self._edit_message(PRIORITY_NORMAL, view=self)
                 except:
                     pass
+                if self._is_closed():
+                    self._close_audio_file(audio_file)
+                    return
+                # ボタンを再度有効化
+                for item in self.children:
+                    item.disabled = False
                 
                 # 新しいメッセージを送信
-                self.followup_message = await self.interaction.followup.send(
-                    content=audio_content,
-                    file=audio_file,
-                    embeds=all_embeds,
-                    view=self,
-                    ephemeral=True,
-                    wait=True
-                )
+                await self._send_audio_question(question, audio_file, all_embeds)
             else:
                 # 音声がない場合: 既存のメッセージを編集
                 try:
-                    await self.followup_message.edit(
-                        content=None,
-                        embeds=all_embeds,
-                        view=self
-                    )
+                    await self._edit_message(PRIORITY_HIGH, content=None, embeds=all_embeds, view=self)
                 except discord.errors.NotFound:
                     # メッセージが見つからない場合は新規送信
-                    self.followup_message = await self.interaction.followup.send(
-                        embeds=all_embeds,
-                        view=self,
-                        ephemeral=True,
-                        wait=True
-                    )
+                    await self._send_followup_message(PRIORITY_HIGH, embeds=all_embeds, view=self)
+        
+        # 🔽 先読み (v3.5): この問題の表示中に、次の問題の準備を始める
+        self._start_prefetch(self.current_question_index + 1)
+
+    async def _send_audio_question(self, question: QuizData, audio_file, all_embeds: list):
+        """
+        音声つきの問題を新しいメッセージで送信する
+        (v3.9: アップロード済みの音声は CDN URL を本文に入れて送り、初回のアップロード時はその URL を記録する)
+        """
+        if isinstance(audio_file, UploadedMedia):
+            try:
+                await self._send_followup_message(
+                    PRIORITY_HIGH, content=f"🎵 **音声を再生:**\n{audio_file.cdn_url}", embeds=all_embeds, view=self
+                )
+                g_media_registry.mark_reused(audio_file)
+                return
+            except discord.HTTPException as e:
+                # CDN URL で送れなかった場合は記録を捨て、ファイルを添付して送り直す
+                print(f"[QuizView] WARNING: アップロード済みの音声を使えないため、添付して送り直します: {e}")
+                g_media_registry.invalidate(audio_file.source_url)
+                audio_file = await self.download_audio_file(question.audio_url)
+                if audio_file is None:
+                    raise
+                if self._is_closed():
+                    self._close_audio_file(audio_file)
+                    return
+        message = await self._send_followup_message(
+            PRIORITY_HIGH, content="🎵 **音声を再生:**", file=audio_file, embeds=all_embeds, view=self
+        )
+        g_media_registry.record_upload(question.audio_fetch_url, message)
 
     async def button_callback(self, interaction: discord.Interaction):
         """
@@ -341,7 +594,8 @@ class QuizView(discord.ui.View):
         """
         
         # 🔽 タイムアウトチェック (v2.4)
-        if self.is_finished():
+        # (永続セッションは View を保持しないため、ボタンを表示した時刻で判定する)
+        if self.session.is_expired() if self.session else self.is_finished():
             await interaction.response.send_message(
                 f"⏰ このクイズセッションは時間切れで終了しました。\n再度遊ぶ場合は </{self.command_name}:{self.command_id}> をクリックしてください。",
                 ephemeral=True
@@ -351,44 +605,31 @@ class QuizView(discord.ui.View):
         # 2問目以降の操作対象(self.interaction)を、
         # このボタンが押されたメッセージ(interaction)に固定する
         self.interaction = interaction
+        clicked_at = time.perf_counter()
         
         await interaction.response.defer() # ボタンの応答
+        if self._is_closed():
+            return
         
         question = self.questions[self.current_question_index]
         selected_option_id = interaction.data['custom_id'] # "answer_1" など
-        selected_answer = selected_option_id.split('_')[1] # "1"
+        if self.session:
+            selected_answer = self.session.choice
+        else:
+            selected_answer = selected_option_id.split('_')[1] # "1"
 
-        is_correct = (selected_answer == question.correct_answer)
+        is_correct = (int(selected_answer) - 1 == question.correct_index)
         
-        # 答え合わせのEmbedを作成
+        # 答え合わせのEmbed（読み込み時に作成済みの共有テンプレート）
         if is_correct:
             self.correct_count += 1
-            color = discord.Color.green()
-            title = "⭕ 正解！"
             result_icon = "⭕"
         else:
-            color = discord.Color.red()
-            title = "❌ 不正解..."
             result_icon = "❌"
-
-        result_embed = discord.Embed(
-            title=title,
-            description=f"**解説:**\n{question.explanation}",
-            color=color
-        )
+        result_embed = get_reveal_embeds(question)[is_correct]
         
         # 正解の選択肢テキストを取得
-        correct_index = int(question.correct_answer) - 1
-        correct_text = question.options[correct_index]
-        
-        # 🔽 画像のみの場合は「選択肢X」と表示
-        has_images = any(img for img in question.option_images)
-        if has_images:
-            label_map = {0: "A", 1: "B", 2: "C", 3: "D", 4: "E", 5: "F", 6: "G", 7: "H", 8: "I"}
-            correct_label = label_map.get(correct_index, str(correct_index+1))
-            result_embed.add_field(name="正解", value=f"選択肢 {correct_label}")
-        else:
-            result_embed.add_field(name="正解", value=f"{correct_text}")
+        correct_text = question.options[question.correct_index]
 
         # 🔽 復習機能 (v2): 結果を記録
         self.results_history.append({
@@ -402,29 +643,40 @@ class QuizView(discord.ui.View):
 
         # ボタンを無効化してメッセージを編集 (質問Embed + 結果Embed + 画像Embeds)
         # (v2.9: 音声ファイルは最初に添付されているのでそのまま残る)
+        if self.session and not self.children:
+            # 永続セッションの View はボタンを持たないため作り直す（空の View で編集するとボタンが消える）
+            self.update_buttons(question)
         for item in self.children:
             item.disabled = True
         
-        main_embed = self.create_embed(question)
-        image_embeds = self.create_image_embeds(question)
-        all_embeds = [main_embed] + image_embeds + [result_embed]
+        # 質問Embedは表示中のものを使い回し、正解数（フッター）だけ更新する
+        main_embed = self._current_embed
+        if main_embed is None:
+            main_embed = self.create_embed(question)
+        else:
+            self._set_footer(main_embed)
+        all_embeds = [main_embed, *get_image_embeds(question), result_embed]
         
         # 🔽 修正: followup_message を編集（音声ファイルはそのまま）
-        if self.followup_message:
-            await self.followup_message.edit(embeds=all_embeds, view=self)
-        else:
-            await interaction.edit_original_response(embeds=all_embeds, view=self)
+        await self._edit_message(PRIORITY_HIGH, embeds=all_embeds, view=self)
+        metrics.CLICK_REVEAL_SECONDS.observe(time.perf_counter() - clicked_at, 'quiz')
 
         # 🔽 待機時間調整 (v2.1): 2秒に設定
-        await asyncio.sleep(2.0)
+        await asyncio.sleep(self.ANSWER_REVEAL_SECONDS)
+        
+        # 待機中に終了した（新しいセッションに置き換えられた・タイムアウトした）場合は、次の問題に進まない
+        if self._is_closed():
+            return
 
         # 次の問題へ
         self.current_question_index += 1
         if self.current_question_index < len(self.questions):
-            if self.followup_message:
+            next_started = time.perf_counter()
+            if self.followup_message or self._edit_clicked_message:
                 await self.show_question_with_followup()
             else:
                 await self.show_question()
+            metrics.NEXT_QUESTION_SECONDS.observe(time.perf_counter() - next_started, 'quiz')
         else:
             await self.show_result() # 全問終了
 
@@ -462,10 +714,7 @@ class QuizView(discord.ui.View):
         self.clear_items() # 全てのボタンを削除
         
         # 🔽 修正: followup_message がある場合はそれを編集（contentをクリア）
-        if self.followup_message:
-            await self.followup_message.edit(content=None, embeds=[result_embed], view=self)
-        else:
-            await self.interaction.edit_original_response(content=None, embeds=[result_embed], view=self)
+        await self._edit_message(PRIORITY_HIGH, content=None, embeds=[result_embed], view=self)
         
         # 🔽 復習機能 (v2): 全問題の詳細を表示
         await self.show_review()
@@ -515,13 +764,20 @@ class QuizView(discord.ui.View):
             review_embeds.append(embed)
         
         # 復習Embedを送信（ephemeralで本人のみに表示）
+        # (急がないため、他のセッションの回答表示などを優先する)
         for embed in review_embeds:
-            await self.interaction.followup.send(embed=embed, ephemeral=True)
+            await g_rest_scheduler.submit(
+                self.interaction.token, PRIORITY_LOW, self.interaction.followup.send, embed=embed, ephemeral=True
+            )
     
     async def on_timeout(self):
         """
         タイムアウト時の処理（5分経過）
         """
+        # 先読みを中止し、登録簿から外す
+        self._cancel_prefetch()
+        g_session_registry.release(self, 'timed_out')
+        
         # ボタンを無効化
         for item in self.children:
             item.disabled = True
@@ -534,9 +790,26 @@ class QuizView(discord.ui.View):
         )
         
         try:
-            if self.followup_message:
-                await self.followup_message.edit(content=None, embeds=[timeout_embed], view=self)
-            else:
-                await self.interaction.edit_original_response(content=None, embeds=[timeout_embed], view=self)
+            await self._edit_message(PRIORITY_LOW, content=None, embeds=[timeout_embed], view=self)
+        except:
+            pass  # メッセージが削除されている場合などのエラーを無視
+        self._release_deck()
+
+    async def on_superseded(self):
+        """
+        同じユーザーが新しいセッションを開始したため、このセッションが終了したときの処理
+        (SessionRegistry から呼ばれる。View はすでに終了済み)
+        """
+        for item in self.children:
+            item.disabled = True
+        
+        superseded_embed = discord.Embed(
+            title="🔁 セッション終了",
+            description=f"新しいセッションを開始したため、このクイズセッションは終了しました。\n\n**正解数:** {self.correct_count}/{self.current_question_index}問",
+            color=discord.Color.light_grey()
+        )
+        
+        try:
+            await self._edit_message(PRIORITY_LOW, content=None, embeds=[superseded_embed], view=self)
         except:
             pass  # メッセージが削除されている場合などのエラーを無視
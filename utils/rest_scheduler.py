@@ -0,0 +1,242 @@
+# Discord への REST 呼び出し（メッセージの送信・編集）のスケジューラー
+# (v1.0: QuizView / DiagnosisView の送信・編集を1か所に集め、優先度と同時実行数を管理する)
+#
+# - 同じバケット（= 同じインタラクションの Webhook トークン）への呼び出しは、送信した順に1つずつ実行する
+#   (Discord のレート制限は Webhook トークンごとのため、同時に投げても 429 で待たされるだけになる)
+# - 全体の同時実行数の上限は、グローバルレート制限の 429 を受けるたびに半分にし（REST_MIN_CONCURRENT まで）、
+#   成功が続くと1ずつ REST_MAX_CONCURRENT まで戻す (v1.1: 固定の 8 では、セッション数が増えると待ち時間が延びるため)
+#   (インタラクションの Webhook はグローバルレート制限の対象外のため、通常は上限に達しない)
+# - 上限に達している場合、空いた枠は優先度の高いものから使う
+#   (回答の表示・次の問題 > 通常 > 復習ページ・YouTubeリンク・タイムアウト表示)
+# - interaction.response（defer など）は3秒以内に応答する必要があるため、ここを通さない
+
+import asyncio
+import collections
+import heapq
+import itertools
+import logging
+import os
+import time
+
+from utils import metrics
+
+# --- 定数 ---
+REST_MAX_CONCURRENT = int(os.getenv('REST_MAX_CONCURRENT', 256))
+REST_MIN_CONCURRENT = int(os.getenv('REST_MIN_CONCURRENT', 8))
+
+PRIORITY_HIGH = 0  # ユーザーが待っている編集（回答の表示・次の問題・結果発表）
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # 後から読めばよい送信（復習ページ・YouTubeリンク・タイムアウト表示）
+PRIORITY_NAMES = {PRIORITY_HIGH: 'high', PRIORITY_NORMAL: 'normal', PRIORITY_LOW: 'low'}
+
+
+class RateLimitCounter(logging.Filter):
+    """
+    discord.py が 429 を受けたときのログを数える
+    (discord.py は 429 を内部で待って再試行するため、呼び出し側からは見えない)
+    (Handler ではなく Filter として付けるため、ログの出力先は変わらない)
+    """
+    LOGGER_NAMES = ('discord.http', 'discord.webhook.async_')
+
+    def __init__(self, stats: dict, on_global=None):
+        super().__init__()
+        self.stats = stats
+        self.on_global = on_global  # グローバルレート制限の 429 を受けたときに呼ぶ関数
+        self._pending_bucket = 0  # まだ bucket として数えていない 429 の数
+
+    def filter(self, record):
+        message = str(record.msg)
+        if 'responded with 429' in message or 'is rate limited' in message:
+            self.stats['rate_limited_429'] += 1
+            if record.args and isinstance(record.args[-1], (int, float)):
+                self.stats['rate_limited_seconds'] += float(record.args[-1])
+            self._defer_bucket_count()
+        elif 'Global rate limit has been hit' in message:
+            # 直前の「responded with 429」と同じ 429 のため、bucket ではなく global として1回だけ数える
+            self.stats['global_429'] += 1
+            if self._pending_bucket:
+                self._pending_bucket -= 1
+            metrics.DISCORD_RATE_LIMITS.inc('global')
+            if self.on_global:
+                self.on_global()
+        return True
+
+    def _defer_bucket_count(self):
+        """
+        グローバルレート制限の場合は、続けて「Global rate limit」のログが出るため、
+        bucket として数えるのはイベントループの次の周回まで待つ
+        """
+        self._pending_bucket += 1
+        try:
+            asyncio.get_running_loop().call_soon(self._flush_bucket_count)
+        except RuntimeError:
+            self._flush_bucket_count()
+
+    def _flush_bucket_count(self):
+        if self._pending_bucket:
+            metrics.DISCORD_RATE_LIMITS.inc('bucket', amount=self._pending_bucket)
+            self._pending_bucket = 0
+
+
+class RestScheduler:
+    """
+    REST 呼び出しを優先度つきのキューに入れ、バケットごとに1つずつ、全体で limit 件まで実行する
+    (limit は max_concurrent から始まり、グローバルレート制限の 429 で半分になり、成功が続くと戻る)
+    使い方: message = await g_rest_scheduler.submit(bucket, PRIORITY_HIGH, message.edit, embeds=..., view=...)
+    """
+    def __init__(self, max_concurrent: int = REST_MAX_CONCURRENT, min_concurrent: int = REST_MIN_CONCURRENT):
+        self.max_concurrent = max_concurrent
+        self.min_concurrent = min(min_concurrent, max_concurrent)
+        self.limit = max_concurrent  # 現在の同時実行数の上限
+        self._successes = 0  # 上限を1つ戻すまでに数える、連続した成功の数
+        self._heap = []  # (priority, 連番, bucket, func, args, kwargs, future, 追加した時刻)
+        self._sequence = itertools.count()
+        self._busy_buckets = set()
+        self._pending = {}  # bucket -> 未実行の呼び出しの連番（追加した順）。同じバケット内では順番を守る
+        self._tasks = set()
+        self._in_flight = 0
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0,  # 実行前に呼び出し元がキャンセルしたもの
+            'max_queue_depth': 0,
+            'queue_wait_ms_total': 0.0,
+            'rate_limited_429': 0,  # discord.py が 429 を受けて待った回数
+            'rate_limited_seconds': 0.0,  # そのために待った合計秒数
+            'global_429': 0,  # rate_limited_429 のうち、グローバルレート制限のもの
+            'limit_reductions': 0,  # グローバルレート制限のため、同時実行数の上限を下げた回数
+        }
+        self._rate_limit_counter = None
+
+    def install_rate_limit_counter(self):
+        """discord.py のロガーに 429 のカウンターを登録する（何度呼んでも1つだけ）"""
+        if self._rate_limit_counter is None:
+            self._rate_limit_counter = RateLimitCounter(self.stats, on_global=self.on_global_rate_limit)
+            for name in RateLimitCounter.LOGGER_NAMES:
+                logging.getLogger(name).addFilter(self._rate_limit_counter)
+
+    def set_max_concurrent(self, max_concurrent: int):
+        """同時実行数の上限を変更する（負荷試験用）"""
+        self.max_concurrent = self.limit = max_concurrent
+        self.min_concurrent = min(self.min_concurrent, max_concurrent)
+        self._dispatch()
+
+    def on_global_rate_limit(self):
+        """グローバルレート制限の 429 を受けたら、同時実行数の上限を半分にする"""
+        new_limit = max(self.min_concurrent, self.limit // 2)
+        if new_limit < self.limit:
+            print(f"[RestScheduler] WARNING: グローバルレート制限のため、同時実行数の上限を {self.limit} → {new_limit} に下げます")
+            self.limit = new_limit
+            self.stats['limit_reductions'] += 1
+        self._successes = 0
+
+    def _on_success(self):
+        """成功が上限の数だけ続いたら、上限を1つ戻す"""
+        if self.limit >= self.max_concurrent:
+            return
+        self._successes += 1
+        if self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+
+    async def submit(self, bucket, priority, func, *args, **kwargs):
+        """func(*args, **kwargs) の実行を予約し、その結果を返す（例外もそのまま伝える）"""
+        future = asyncio.get_running_loop().create_future()
+        sequence = next(self._sequence)
+        heapq.heappush(self._heap, (priority, sequence, bucket, func, args, kwargs, future, time.perf_counter()))
+        self._pending.setdefault(bucket, collections.deque()).append(sequence)
+        self.stats['submitted'] += 1
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], len(self._heap))
+        self._dispatch()
+        return await future
+
+    def _dispatch(self):
+        """
+        空いている枠に、実行できる（バケットが空いている）うち最も優先度の高い呼び出しを割り当てる
+        (キャンセル済みの呼び出しを捨てたことで、先に飛ばした同じバケットの呼び出しが実行できるようになる場合があるため、
+         その場合はもう一周する)
+        """
+        while True:
+            skipped = []
+            dropped_cancelled = False
+            while self._heap and self._in_flight < self.limit:
+                item = heapq.heappop(self._heap)
+                sequence, bucket, future = item[1], item[2], item[6]
+                if bucket in self._busy_buckets or self._pending[bucket][0] != sequence:
+                    # 同じバケットの呼び出しが実行中、またはそれより前に追加されたものが残っている
+                    skipped.append(item)
+                    continue
+                self._pop_pending(bucket)
+                if future.cancelled():
+                    self.stats['cancelled'] += 1
+                    dropped_cancelled = True
+                    continue
+                self._busy_buckets.add(bucket)
+                self._in_flight += 1
+                task = asyncio.ensure_future(self._run(item))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            for item in skipped:
+                heapq.heappush(self._heap, item)
+            if not (dropped_cancelled and skipped):
+                return
+
+    def _pop_pending(self, bucket):
+        pending = self._pending[bucket]
+        pending.popleft()
+        if not pending:
+            del self._pending[bucket]
+
+    async def _run(self, item):
+        priority, _, bucket, func, args, kwargs, future, queued_at = item
+        priority_name = PRIORITY_NAMES.get(priority, str(priority))
+        started = time.perf_counter()
+        self.stats['queue_wait_ms_total'] += (started - queued_at) * 1000
+        metrics.DISCORD_REST_QUEUE_SECONDS.observe(started - queued_at, priority_name)
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.stats['failed'] += 1
+            metrics.DISCORD_REST_ERRORS.inc(priority_name, type(e).__name__)
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.stats['completed'] += 1
+            self._on_success()
+            if not future.done():
+                future.set_result(result)
+        finally:
+            metrics.DISCORD_REST_SECONDS.observe(time.perf_counter() - started, priority_name)
+            self._busy_buckets.discard(bucket)
+            self._in_flight -= 1
+            self._dispatch()
+
+    def get_stats(self) -> dict:
+        """キューの深さ・429 の回数などの統計を返す"""
+        stats = dict(self.stats)
+        stats['queue_depth'] = len(self._heap)
+        stats['in_flight'] = self._in_flight
+        stats['concurrency_limit'] = self.limit
+        depth_by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+        for item in self._heap:
+            depth_by_priority[PRIORITY_NAMES.get(item[0], str(item[0]))] += 1
+        stats['queue_depth_by_priority'] = depth_by_priority
+        started = stats['completed'] + stats['failed']
+        stats['avg_queue_wait_ms'] = round(stats['queue_wait_ms_total'] / started, 1) if started else 0.0
+        return stats
+
+
+g_rest_scheduler = RestScheduler()
+g_rest_scheduler.install_rate_limit_counter()
+metrics.CallbackMetric(
+    'quizbot_discord_rest_queue_depth', 'Discord REST calls waiting in the scheduler queue.',
+    lambda: len(g_rest_scheduler._heap)
+)
+metrics.CallbackMetric(
+    'quizbot_discord_rest_concurrency_limit', 'Current cap on in-flight Discord REST calls (lowered on global 429s).',
+    lambda: g_rest_scheduler.limit
+)
@@ -0,0 +1,180 @@
+# 実行中のクイズ・診断セッション（QuizView / DiagnosisView）の登録簿
+# (v1.0: ユーザーごと・全体の同時セッション数を制限し、セッション数・メモリ・所要時間を集計する)
+#
+# - キーは (ユーザーID, コマンド名)。同じコマンドを再実行したら、古いセッションを終了して置き換える
+# - 1人あたりの同時セッション数が MAX_SESSIONS_PER_USER を超えたら、そのユーザーの最も古いセッションを終了する
+# - 全体の同時セッション数が MAX_ACTIVE_SESSIONS に達したら、空きが出るまで最大 SESSION_WAIT_TIMEOUT 秒待たせる
+#   (待っても空かなければ登録を断り、呼び出し側で「混雑しています」と表示する)
+# - 永続セッション（persistent_session）は View を保持しないため、ここには登録しない
+
+import asyncio
+import collections
+import os
+import sys
+import time
+
+from utils import metrics
+
+# --- 定数 ---
+MAX_SESSIONS_PER_USER = int(os.getenv('MAX_SESSIONS_PER_USER', 2))
+MAX_ACTIVE_SESSIONS = int(os.getenv('MAX_ACTIVE_SESSIONS', 500))
+SESSION_WAIT_TIMEOUT = float(os.getenv('SESSION_WAIT_TIMEOUT', 10))
+DURATION_SAMPLES = 1000  # 所要時間の統計に使う、直近の終了セッション数
+
+
+def estimate_session_bytes(view) -> int:
+    """
+    セッション1つが独自に持っているメモリのおおよそのバイト数
+    (View の属性と、その中のリスト・辞書の要素まで。全セッションで共有するデッキ・テンプレートは数えない)
+    """
+    total = sys.getsizeof(view) + sys.getsizeof(vars(view))
+    for value in vars(view).values():
+        if isinstance(value, (list, tuple, dict, set)):
+            total += sys.getsizeof(value)
+            items = value.values() if isinstance(value, dict) else value
+            for item in items:
+                if isinstance(item, (dict, list)):
+                    total += sys.getsizeof(item)
+    return total
+
+
+class SessionRegistry:
+    """
+    実行中のセッションの登録簿
+    使い方: if not await g_session_registry.register(user_id, command_name, view): (混雑中)
+            終了時（View.stop / on_timeout）に g_session_registry.release(view, reason) を呼ぶ
+    """
+    def __init__(self, max_per_user: int = MAX_SESSIONS_PER_USER, max_active: int = MAX_ACTIVE_SESSIONS,
+                 wait_timeout: float = SESSION_WAIT_TIMEOUT):
+        self.max_per_user = max(1, max_per_user)  # 0 以下では新しいセッションも登録できなくなるため
+        self.max_active = max_active
+        self.wait_timeout = wait_timeout
+        self._sessions = {}  # (user_id, command_name) -> (view, 開始時刻)。辞書の順番 = 開始した順
+        self._keys = {}  # view -> (user_id, command_name)
+        self._user_counts = collections.Counter()
+        self._waiters = collections.deque()  # 空きを待っている登録（asyncio.Future）
+        self._durations = collections.deque(maxlen=DURATION_SAMPLES)
+        self.stats = {
+            'started': 0,
+            'finished': 0,  # 最後まで終わったもの
+            'timed_out': 0,
+            'superseded': 0,  # 同じユーザーの新しいセッションに置き換えられたもの
+            'waited': 0,  # 全体の上限に達していて、空きを待ったもの
+            'rejected': 0,  # 待っても空かずに断ったもの
+            'max_active': 0,
+        }
+
+    def __len__(self):
+        return len(self._sessions)
+
+    async def register(self, user_id, command_name: str, view) -> bool:
+        """セッションを登録する（全体の上限に達していて、待っても空かなかった場合は False）"""
+        key = (user_id, command_name)
+        self._make_room_for(key)
+
+        if len(self._sessions) >= self.max_active and not await self._wait_for_slot():
+            self.stats['rejected'] += 1
+            print(f"[SessionRegistry] WARNING: 同時セッション数が上限（{self.max_active}）のため、/{command_name} を開始できませんでした")
+            return False
+
+        # 待っている間に同じユーザーの登録が済んでいる場合があるため、もう一度確認する
+        # (ここから登録までは await を挟まないため、他の登録と入れ違いにならない)
+        self._make_room_for(key)
+        self._sessions[key] = (view, time.monotonic())
+        self._keys[view] = key
+        self._user_counts[user_id] += 1
+        self.stats['started'] += 1
+        self.stats['max_active'] = max(self.stats['max_active'], len(self._sessions))
+        return True
+
+    def _make_room_for(self, key):
+        """同じキーの古いセッションと、1人あたりの上限を超える古いセッションを終了する"""
+        user_id = key[0]
+        previous = self._sessions.get(key)
+        if previous is not None:
+            self._supersede(previous[0])
+        while self._user_counts[user_id] >= self.max_per_user:
+            oldest = next((v for (uid, _), (v, _) in self._sessions.items() if uid == user_id), None)
+            if oldest is None:
+                # カウントと登録簿がずれている（本来は起きない）。数え直して続ける
+                print(f"[SessionRegistry] WARNING: ユーザー {user_id} のセッション数が登録簿と一致しないため、数え直します")
+                self._user_counts[user_id] = 0
+                break
+            self._supersede(oldest)
+
+    async def _wait_for_slot(self) -> bool:
+        """全体の同時セッション数が上限を下回るまで待つ（wait_timeout 秒を過ぎたら False）"""
+        self.stats['waited'] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        while len(self._sessions) >= self.max_active:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        return True
+
+    def _supersede(self, view):
+        """古いセッションを終了し、ボタンを無効にした「終了しました」の表示に切り替える"""
+        self.release(view, 'superseded')
+        view.stop()
+        asyncio.ensure_future(view.on_superseded())
+
+    def release(self, view, reason: str = 'finished'):
+        """セッションの登録を外す（登録されていない View の場合は何もしない）"""
+        key = self._keys.pop(view, None)
+        if key is None:
+            return
+        _, started_at = self._sessions.pop(key)
+        self._user_counts[key[0]] -= 1
+        if not self._user_counts[key[0]]:
+            del self._user_counts[key[0]]
+        self._durations.append(time.monotonic() - started_at)
+        self.stats[reason] += 1
+        # 空きを待っている登録を1つ起こす
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def get_stats(self) -> dict:
+        """実行中のセッション数・1セッションあたりのメモリ・所要時間などの統計を返す"""
+        stats = dict(self.stats)
+        stats['active'] = len(self._sessions)
+        stats['waiting'] = len(self._waiters)
+        by_command = collections.Counter(command_name for _, command_name in self._sessions)
+        stats['active_by_command'] = dict(by_command)
+        if self._sessions:
+            total_bytes = sum(estimate_session_bytes(view) for view, _ in self._sessions.values())
+            stats['active_bytes'] = total_bytes
+            stats['avg_bytes_per_session'] = total_bytes // len(self._sessions)
+        else:
+            stats['active_bytes'] = stats['avg_bytes_per_session'] = 0
+        durations = sorted(self._durations)
+        if durations:
+            stats['duration_p50_s'] = round(durations[len(durations) // 2], 1)
+            stats['duration_p95_s'] = round(durations[max(0, int(len(durations) * 0.95) - 1)], 1)
+            stats['duration_max_s'] = round(durations[-1], 1)
+        return stats
+
+
+# ボット全体で共有する登録簿
+g_session_registry = SessionRegistry()
+metrics.CallbackMetric(
+    'quizbot_active_sessions', 'Quiz and diagnosis sessions currently held in memory.', lambda: len(g_session_registry)
+)
+metrics.CallbackMetric(
+    'quizbot_sessions_total', 'Sessions by outcome (started, finished, timed_out, superseded, rejected).',
+    lambda: {(outcome,): g_session_registry.stats[outcome]
+             for outcome in ('started', 'finished', 'timed_out', 'superseded', 'rejected')},
+    kind='counter', labelnames=('outcome',)
+)
@@ -0,0 +1,131 @@
+# Sheets API v4 を aiohttp で直接呼び出す非同期の読み込み
+# (v1.0: gspread（同期）を別スレッドで動かす代わりに、イベントループ上でシートを取得する)
+
+import asyncio
+import json
+import os
+import time
+
+import google.auth.crypt
+import google.auth.jwt
+
+from utils import http_client
+
+# --- 定数 ---
+CREDENTIALS_FILE = 'credentials.json'  # sheets_loader と同じサービスアカウント
+SHEETS_API_BASE_URL = os.getenv('SHEETS_API_BASE_URL', 'https://sheets.googleapis.com/v4')
+DRIVE_API_BASE_URL = os.getenv('DRIVE_API_BASE_URL', 'https://www.googleapis.com/drive/v3')
+SHEETS_SPREADSHEET_ID = os.getenv('SHEETS_SPREADSHEET_ID', '')  # 未設定の場合は gspread で名前から調べる
+SHEETS_TOKEN_URL = os.getenv('SHEETS_TOKEN_URL', '')  # 未設定の場合は credentials.json の token_uri
+# シートの値の読み取りと、最終更新時刻（Drive のメタデータ）の確認に必要な権限
+READONLY_SCOPE = ('https://www.googleapis.com/auth/spreadsheets.readonly '
+                  'https://www.googleapis.com/auth/drive.metadata.readonly')
+TOKEN_LIFETIME = 3600
+TOKEN_REFRESH_MARGIN = 300  # 期限切れの何秒前にトークンを取り直すか
+
+
+class SheetsApiError(Exception):
+    """Sheets API / トークンの取得に失敗した"""
+
+
+class ServiceAccountTokenProvider:
+    """
+    サービスアカウントのアクセストークンを非同期に取得・更新する
+    (JWT への署名はローカルで行い、トークンの交換だけを aiohttp で行う)
+    """
+    def __init__(self, service_account_info: dict, token_url: str = None, scope: str = READONLY_SCOPE):
+        self.signer = google.auth.crypt.RSASigner.from_service_account_info(service_account_info)
+        self.client_email = service_account_info['client_email']
+        self.token_url = token_url or service_account_info.get('token_uri', 'https://oauth2.googleapis.com/token')
+        self.scope = scope
+        self._token = None
+        self._expires_at = 0
+        self._lock = asyncio.Lock()  # 同時に期限切れになっても、取り直しは1回だけ
+
+    @classmethod
+    def from_file(cls, path: str = CREDENTIALS_FILE):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), token_url=SHEETS_TOKEN_URL or None)
+
+    def _make_assertion(self) -> bytes:
+        now = int(time.time())
+        payload = {
+            'iss': self.client_email,
+            'scope': self.scope,
+            'aud': self.token_url,
+            'iat': now,
+            'exp': now + TOKEN_LIFETIME,
+        }
+        return google.auth.jwt.encode(self.signer, payload)
+
+    async def get_token(self) -> str:
+        if self._token and time.time() < self._expires_at - TOKEN_REFRESH_MARGIN:
+            return self._token
+        async with self._lock:
+            if self._token and time.time() < self._expires_at - TOKEN_REFRESH_MARGIN:
+                return self._token
+            data = {
+                'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
+                'assertion': self._make_assertion().decode('ascii'),
+            }
+            async with http_client.get_session().post(self.token_url, data=data) as resp:
+                if resp.status != 200:
+                    raise SheetsApiError(f"アクセストークンを取得できません (HTTP {resp.status}): {await resp.text()}")
+                body = await resp.json()
+            self._token = body['access_token']
+            self._expires_at = time.time() + int(body.get('expires_in', TOKEN_LIFETIME))
+            print("[SheetsAsync] アクセストークンを取得しました。")
+            return self._token
+
+
+class StaticTokenProvider:
+    """固定のトークンを返す（ローカルの偽 Sheets サーバーでの動作確認・ベンチマーク用）"""
+    def __init__(self, token: str = 'test-token'):
+        self.token = token
+
+    async def get_token(self) -> str:
+        return self.token
+
+
+class AsyncSheetsClient:
+    """
+    values:batchGet で複数のシートの値をまとめて取得する
+    戻り値の形式は values API と同じ（行のリスト）で、records への変換は呼び出し側で行う
+    (v1.1: Drive API でスプレッドシートの最終更新時刻も確認できる)
+    """
+    def __init__(self, spreadsheet_id: str, token_provider, base_url: str = SHEETS_API_BASE_URL,
+                 drive_base_url: str = DRIVE_API_BASE_URL):
+        self.spreadsheet_id = spreadsheet_id
+        self.token_provider = token_provider
+        self.base_url = base_url.rstrip('/')
+        self.drive_base_url = drive_base_url.rstrip('/')
+
+    async def get_modified_time(self) -> str:
+        """スプレッドシートの最終更新時刻（Drive の modifiedTime。RFC 3339 形式）を返す"""
+        token = await self.token_provider.get_token()
+        url = f"{self.drive_base_url}/files/{self.spreadsheet_id}"
+        params = {'fields': 'modifiedTime', 'supportsAllDrives': 'true'}
+        headers = {'Authorization': f'Bearer {token}'}
+        async with http_client.get_session().get(url, params=params, headers=headers) as resp:
+            if resp.status != 200:
+                raise SheetsApiError(f"files.get が失敗しました (HTTP {resp.status}): {(await resp.text())[:200]}")
+            body = await resp.json()
+        return body['modifiedTime']
+
+    async def batch_get_values(self, ranges) -> list:
+        """
+        ranges: A1形式の範囲のリスト
+        戻り値: 範囲ごとの values（行のリスト）のリスト
+        """
+        token = await self.token_provider.get_token()
+        url = f"{self.base_url}/spreadsheets/{self.spreadsheet_id}/values:batchGet"
+        params = [('ranges', r) for r in ranges] + [('majorDimension', 'ROWS')]
+        headers = {'Authorization': f'Bearer {token}'}
+        async with http_client.get_session().get(url, params=params, headers=headers) as resp:
+            if resp.status != 200:
+                raise SheetsApiError(f"values:batchGet が失敗しました (HTTP {resp.status}): {(await resp.text())[:200]}")
+            body = await resp.json()
+        value_ranges = body.get('valueRanges', [])
+        if len(value_ranges) != len(ranges):
+            raise SheetsApiError(f"values:batchGet の結果の数が一致しません ({len(value_ranges)} / {len(ranges)})")
+        return [value_range.get('values', []) for value_range in value_ranges]
@@ -0,0 +1,117 @@
+# シートデータのローカルスナップショット
+# (v1.0: 取得したシートを SQLite に保存し、再起動直後やGoogle APIに繋がらない時に使う)
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# --- 定数 ---
+# Render で再デプロイ後も残したい場合は、永続ディスク上のパスを指定する
+SNAPSHOT_PATH = os.getenv('SHEETS_SNAPSHOT_PATH', 'sheets_snapshot.sqlite3')
+SNAPSHOT_ENABLED = os.getenv('SHEETS_SNAPSHOT', '1') != '0'
+SCHEMA_VERSION = 1
+
+g_conn = None
+g_lock = threading.Lock()  # sheets_loader のワーカースレッドから同時に呼ばれるため
+
+
+def _get_connection():
+    """SQLite の接続を返す（初回はテーブルを作成する）。g_lock を保持した状態で呼ぶ"""
+    global g_conn
+    if g_conn is not None:
+        return g_conn
+
+    conn = sqlite3.connect(SNAPSHOT_PATH, check_same_thread=False)
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    row = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    if row is not None and int(row[0]) != SCHEMA_VERSION:
+        # 形式が変わった古いスナップショットは捨てる
+        print(f"[SheetsSnapshot] スナップショットの形式が古いため作り直します (v{row[0]} → v{SCHEMA_VERSION})")
+        conn.execute("DROP TABLE IF EXISTS sheets")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sheets ("
+        " name TEXT PRIMARY KEY,"
+        " fetched_at REAL NOT NULL,"  # APIから取得した時刻
+        " content_hash TEXT NOT NULL,"  # データの内容のハッシュ（変化の検出用）
+        " data BLOB NOT NULL"  # zlib 圧縮した JSON
+        ")"
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+        (str(SCHEMA_VERSION),)
+    )
+    conn.commit()
+    g_conn = conn
+    return conn
+
+
+def content_hash(records) -> str:
+    """records の内容のハッシュ"""
+    return hashlib.sha1(_encode_json(records)).hexdigest()
+
+
+def _encode_json(records) -> bytes:
+    return json.dumps(records, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def save_sheet(sheet_name, records, fetched_at=None):
+    """取得したシートを保存する（内容が変わっていなければ取得時刻だけ更新する）"""
+    if not SNAPSHOT_ENABLED:
+        return
+    fetched_at = fetched_at or time.time()
+    try:
+        encoded = _encode_json(records)
+        digest = hashlib.sha1(encoded).hexdigest()
+        with g_lock:
+            conn = _get_connection()
+            row = conn.execute("SELECT content_hash FROM sheets WHERE name = ?", (sheet_name,)).fetchone()
+            if row is not None and row[0] == digest:
+                conn.execute("UPDATE sheets SET fetched_at = ? WHERE name = ?", (fetched_at, sheet_name))
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sheets (name, fetched_at, content_hash, data) VALUES (?, ?, ?, ?)",
+                    (sheet_name, fetched_at, digest, zlib.compress(encoded))
+                )
+            conn.commit()
+    except Exception as e:
+        print(f"[SheetsSnapshot] ERROR: シート '{sheet_name}' の保存に失敗しました: {e}")
+
+
+def load_sheet(sheet_name):
+    """
+    保存済みのシートを返す
+    戻り値: (records, fetched_at)（保存されていない場合は (None, None)）
+    """
+    if not SNAPSHOT_ENABLED:
+        return None, None
+    try:
+        with g_lock:
+            row = _get_connection().execute(
+                "SELECT data, fetched_at FROM sheets WHERE name = ?", (sheet_name,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(zlib.decompress(row[0])), row[1]
+    except Exception as e:
+        print(f"[SheetsSnapshot] ERROR: シート '{sheet_name}' の読み込みに失敗しました: {e}")
+        return None, None
+
+
+def load_all():
+    """
+    保存済みのすべてのシートを返す
+    戻り値: {シート名: (records, fetched_at)}
+    """
+    if not SNAPSHOT_ENABLED or not os.path.exists(SNAPSHOT_PATH):
+        return {}
+    try:
+        with g_lock:
+            rows = _get_connection().execute("SELECT name, data, fetched_at FROM sheets").fetchall()
+        return {name: (json.loads(zlib.decompress(data)), fetched_at) for name, data, fetched_at in rows}
+    except Exception as e:
+        print(f"[SheetsSnapshot] ERROR: スナップショットの読み込みに失敗しました: {e}")
+        return {}
@@ -0,0 +1,122 @@
+# ヘルスチェック・メトリクス用の Web サーバー
+# (v1.0: ボットと同じイベントループ上で aiohttp.web を動かす。Flask は WEB_SERVER=flask の場合のみ読み込む)
+#
+# エンドポイント:
+#   /         Render のヘルスチェック用（"Bot is alive!" を返すだけ。ログは出さない）
+#   /healthz  生存確認。イベントループ上で応答するため、ループが止まっていれば応答しない
+#   /readyz   準備完了の確認。Gateway の接続・コマンドの同期・キャッシュの先読みが済んでいれば 200、まだなら 503
+#   /metrics  Prometheus 形式のメトリクス（utils/metrics.py）
+
+import json
+import os
+import threading
+import time
+
+from aiohttp import web
+
+from utils import metrics
+
+# --- 定数 ---
+WEB_SERVER = os.getenv('WEB_SERVER', 'aiohttp')  # 'aiohttp': ボットと同じループ / 'flask': 別スレッドの Flask
+WEB_HOST = '0.0.0.0'
+
+g_started_at = time.monotonic()
+g_runner = None  # aiohttp の web.AppRunner（起動中のみ）
+
+
+def liveness() -> dict:
+    return {'status': 'ok', 'uptime_s': round(time.monotonic() - g_started_at, 1)}
+
+
+def readiness(readiness_func) -> tuple:
+    """
+    readiness_func() の結果（{'checks': {項目名: bool}, ...}）から、/readyz の (HTTPステータス, 本文) を作る
+    """
+    try:
+        state = readiness_func()
+    except Exception as e:
+        return 503, {'ready': False, 'error': str(e)}
+    ready = all(state.get('checks', {}).values())
+    return (200 if ready else 503), {'ready': ready, **state}
+
+
+# 🔽 --- aiohttp（ボットと同じイベントループ） --- 🔽
+async def _handle_root(request):
+    return web.Response(text="Bot is alive!")
+
+
+async def _handle_healthz(request):
+    return web.json_response(liveness())
+
+
+async def _handle_readyz(request):
+    status, body = readiness(request.app['readiness_func'])
+    return web.json_response(body, status=status)
+
+
+async def _handle_metrics(request):
+    return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+async def start_aiohttp_server(port: int, readiness_func) -> web.AppRunner:
+    """実行中のイベントループ上で Web サーバーを起動する（stop() で停止）"""
+    global g_runner
+    app = web.Application()
+    app['readiness_func'] = readiness_func
+    app.router.add_get('/', _handle_root)
+    app.router.add_get('/healthz', _handle_healthz)
+    app.router.add_get('/readyz', _handle_readyz)
+    app.router.add_get('/metrics', _handle_metrics)
+    # アクセスログは出さない（Render のヘルスチェックで毎回ログが出るのを防ぐ）
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEB_HOST, port).start()
+    g_runner = runner
+    print(f"[Web Server] aiohttp を起動しました (ポート: {port})")
+    return runner
+
+
+# 🔽 --- Flask（従来の方式: 別スレッド） --- 🔽
+def start_flask_server(port: int, readiness_func) -> threading.Thread:
+    """Flask を daemon thread で起動する（ボット終了時に自動終了）"""
+    from flask import Flask, Response
+
+    app = Flask('')
+
+    @app.route('/')
+    def health_check():
+        return "Bot is alive!"
+
+    @app.route('/healthz')
+    def healthz():
+        return Response(json.dumps(liveness()), content_type='application/json')
+
+    @app.route('/readyz')
+    def readyz():
+        status, body = readiness(readiness_func)
+        return Response(json.dumps(body), status=status, content_type='application/json')
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+    thread = threading.Thread(target=lambda: app.run(host=WEB_HOST, port=port), daemon=True)
+    thread.start()
+    print(f"[Web Server] Flask を別スレッドで起動しました (ポート: {port})")
+    return thread
+
+
+async def start(port: int, readiness_func):
+    """WEB_SERVER の設定に従って Web サーバーを起動する"""
+    if WEB_SERVER == 'flask':
+        return start_flask_server(port, readiness_func)
+    return await start_aiohttp_server(port, readiness_func)
+
+
+async def stop():
+    """aiohttp の Web サーバーを停止する（Flask のスレッドはプロセスの終了とともに終わる）"""
+    global g_runner
+    if g_runner is not None:
+        await g_runner.cleanup()
+        g_runner = None
+        print("[Web Server] aiohttp を停止しました。")